@@ -0,0 +1,206 @@
+"""
+Load benchmark of the API against a local database, reports throughput and latency percentiles
+"""
+
+import sys
+import json
+import logging
+import random
+from os import environ, path
+from time import perf_counter
+from threading import Thread
+from http.client import HTTPConnection
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+# The API modules are flat modules in api/src
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), "src"))
+
+# Third-party modules
+import click
+from sqlalchemy import create_engine, make_url
+
+# Own Modules
+from seed import seed_database, drop_database, LAST_NAMES, CITIES
+
+# Path of a request per scenario, persons is the number of seeded persons
+SCENARIOS = {
+    "user": lambda rnd, persons: f"/api/user/{rnd.randint(1, persons)}",
+    "users_page": lambda rnd, persons: f"/api/users?limit=100&after={rnd.randint(0, max(persons - 100, 0))}",
+    "search": lambda rnd, persons: f"/api/search?nachname={quote(rnd.choice(LAST_NAMES)[:4])}&limit=20",
+    "search_ort": lambda rnd, persons: f"/api/search?ort={quote(rnd.choice(CITIES)[0])}&limit=20",
+    "statistics": lambda rnd, persons: "/api/statistics",
+    "locations": lambda rnd, persons: "/api/stats/locations?level=ort",
+    "pdf": lambda rnd, persons: "/api/view-statistics-pdf"
+}
+DEFAULT_SCENARIOS = "user,users_page,search,search_ort,statistics,locations,pdf"
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def absolute_database_url(database):
+    """
+    Resolves a relative SQLite file against the current directory, Flask-SQLAlchemy
+    would resolve it against the instance folder and serve another, empty file
+    """
+    url = make_url(database)
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:" \
+            and not url.database.startswith("file:") and not path.isabs(url.database):
+        url = url.set(database=path.abspath(url.database))
+    return url.render_as_string(hide_password=False)
+
+
+def start_server(database_url):
+    """
+    Boots create_app against the database in a threaded server, returns its base URL
+    """
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    environ.setdefault("SECRET_PROVIDER", "env")
+    environ.setdefault("SECRET_KEY", "benchmark")
+    environ["DATABASE_URL"] = database_url
+    from app import app
+    from statistics_store import init_store
+
+    with app.app_context():
+        init_store()
+
+    # No log line per request, HTTP/1.1 so the clients keep their connection open
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def run_client(base_url, scenario, persons, deadline, seed):
+    rnd = random.Random(seed)
+    parts = urlsplit(base_url)
+    connection = HTTPConnection(parts.hostname, parts.port, timeout=60)
+    latencies = []
+    errors = 0
+    while perf_counter() < deadline:
+        target = SCENARIOS[scenario](rnd, persons)
+        start = perf_counter()
+        try:
+            connection.request("GET", target)
+            response = connection.getresponse()
+            response.read()
+            # A missing id after deletes is still a served request
+            if response.status >= 500:
+                errors += 1
+        except OSError:
+            errors += 1
+            connection.close()
+            connection = HTTPConnection(parts.hostname, parts.port, timeout=60)
+            continue
+        latencies.append(perf_counter() - start)
+    connection.close()
+    return latencies, errors
+
+
+def run_scenario(base_url, scenario, persons, clients, duration, warmup):
+    if warmup:
+        run_client(base_url, scenario, persons, perf_counter() + warmup, seed=0)
+
+    start = perf_counter()
+    deadline = start + duration
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(
+            lambda client: run_client(base_url, scenario, persons, deadline, seed=client + 1), range(clients)
+        ))
+    elapsed = perf_counter() - start
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": _ms(percentile(latencies, 0.50)),
+        "p95_ms": _ms(percentile(latencies, 0.95)),
+        "p99_ms": _ms(percentile(latencies, 0.99))
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Scenarios whose p95 grew or whose throughput dropped by more than tolerance
+    """
+    found = []
+    for scenario, result in results.items():
+        before = baseline.get(scenario)
+        if not before or not result["requests"]:
+            continue
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{scenario}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            found.append(f"{scenario}: throughput {before['throughput']} -> {result['throughput']} req/s")
+    return found
+
+
+@click.command()
+@click.option("--persons", type=int, default=10000, show_default=True, help="Persons seeded into the database.")
+@click.option("--database", default="sqlite:///benchmark.db", show_default=True, help="SQLAlchemy URL of the local database.")
+@click.option("--reseed", is_flag=True, help="Drop the tables and seed again.")
+@click.option("--url", default=None, help="Benchmark an already running API instead of starting one.")
+@click.option("--scenarios", default=DEFAULT_SCENARIOS, show_default=True, help="Comma separated scenarios.")
+@click.option("--clients", type=int, default=8, show_default=True, help="Concurrent clients.")
+@click.option("--duration", type=float, default=10, show_default=True, help="Seconds per scenario.")
+@click.option("--warmup", type=float, default=2, show_default=True, help="Seconds of warm-up per scenario.")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results as JSON.")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="Compare with earlier results.")
+@click.option("--tolerance", type=float, default=0.2, show_default=True, help="Allowed regression against the baseline.")
+def benchmark(persons, database, reseed, url, scenarios, clients, duration, warmup, output, baseline, tolerance):
+    """
+    Seed the database, drive the API with concurrent clients and report
+    throughput and p50/p95/p99, exits with 1 on regressions against the baseline
+    """
+    scenarios = [scenario.strip() for scenario in scenarios.split(",") if scenario.strip()]
+    unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+    if unknown:
+        raise click.BadParameter(f"Unknown scenarios {', '.join(unknown)}", param_hint="--scenarios")
+
+    if url is None:
+        # The seeder and the API must open the same file
+        database = absolute_database_url(database)
+        engine = create_engine(database)
+        if reseed:
+            drop_database(engine)
+        start = perf_counter()
+        seed_database(engine, persons)
+        engine.dispose()
+        click.echo(f"Database with {persons} persons ready in {perf_counter() - start:.1f}s")
+        url = start_server(database)
+
+    results = {}
+    click.echo(f"{'scenario':<12} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for scenario in scenarios:
+        result = results[scenario] = run_scenario(url, scenario, persons, clients, duration, warmup)
+        click.echo(f"{scenario:<12} {result['requests']:>9} {result['errors']:>7} {result['throughput']:>9} "
+                   f"{result['p50_ms']!s:>9} {result['p95_ms']!s:>9} {result['p99_ms']!s:>9}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump({"persons": persons, "clients": clients, "results": results}, file, indent=2)
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as file:
+            found = regressions(results, json.load(file)["results"], tolerance)
+        for regression in found:
+            click.echo(f"Regression {regression}")
+        if found:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,68 @@
+"""
+Import time of a cold start of the API per module, measured with -X importtime
+"""
+
+import sys
+import subprocess
+from os import environ, getenv, path
+
+# Third-party modules
+import click
+
+# Seconds a cold import of the API may take, including the secrets and the engine
+IMPORT_TIME_BUDGET = float(getenv("IMPORT_TIME_BUDGET", "2.0"))
+
+SRC = path.join(path.dirname(path.dirname(path.abspath(__file__))), "src")
+
+
+def measure_imports(module="app"):
+    """
+    Imports the module in a new interpreter with -X importtime, returns
+    {module: (self seconds, cumulative seconds)} and the total in seconds
+    """
+    # Without these the secrets would be fetched from Key Vault
+    env = dict(environ)
+    env.setdefault("SECRET_PROVIDER", "env")
+    env.setdefault("SECRET_KEY", "import-time")
+    env.setdefault("DATABASE_URL", "sqlite://")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import of {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        modules[name] = (int(self_time) / 1e6, int(cumulative) / 1e6)
+    return modules, modules.get(module, (0, 0))[1]
+
+
+def report(modules, top):
+    # Slowest modules by their own import time
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return [f"{own:8.3f}s {cumulative:8.3f}s  {name}" for name, (own, cumulative) in slowest]
+
+
+@click.command()
+@click.option("--module", default="app", show_default=True, help="Module to import, app loads the secrets and creates the engine.")
+@click.option("--top", type=int, default=20, show_default=True, help="Number of modules listed.")
+@click.option("--budget", type=float, default=IMPORT_TIME_BUDGET, show_default=True, help="Allowed seconds.")
+def import_time(module, top, budget):
+    """
+    Print the slowest modules of a cold import, exits with 1 over budget
+    """
+    modules, total = measure_imports(module)
+    click.echo(f"{'self':>9} {'cumul.':>9}  module")
+    for line in report(modules, top):
+        click.echo(line)
+    click.echo(f"{total:8.3f}s total import of {module}, budget {budget:.3f}s")
+    if total > budget:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    import_time()
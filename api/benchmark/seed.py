@@ -0,0 +1,99 @@
+"""
+Seeds a local database with persons with German names and addresses for the benchmark
+"""
+
+import random
+from datetime import date, timedelta
+
+# Third-party modules
+from sqlalchemy import select, insert, func, inspect
+
+# Own Modules
+from database import db
+from models import Person, Kontakt, Adresse, Statistik
+
+FIRST_NAMES = [
+    "Anna", "Emma", "Mia", "Sophia", "Lena", "Hannah", "Marie", "Laura", "Lea", "Julia",
+    "Katharina", "Sabine", "Ursula", "Monika", "Petra", "Claudia", "Jana", "Nina", "Sarah", "Johanna",
+    "Lukas", "Leon", "Finn", "Jonas", "Paul", "Felix", "Maximilian", "Elias", "Noah", "Ben",
+    "Thomas", "Michael", "Andreas", "Stefan", "Peter", "Jürgen", "Wolfgang", "Klaus", "Uwe", "Matthias"
+]
+LAST_NAMES = [
+    "Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz", "Hoffmann",
+    "Schäfer", "Koch", "Bauer", "Richter", "Klein", "Wolf", "Schröder", "Neumann", "Schwarz", "Zimmermann",
+    "Braun", "Krüger", "Hofmann", "Hartmann", "Lange", "Schmitt", "Werner", "Schmitz", "Krause", "Meier",
+    "Lehmann", "Schmid", "Schulze", "Maier", "Köhler", "Herrmann", "König", "Walter", "Mayer", "Huber"
+]
+# Ort, land and the first digits of its postcodes
+CITIES = [
+    ("Berlin", "Deutschland", "10"), ("Hamburg", "Deutschland", "20"), ("München", "Deutschland", "80"),
+    ("Köln", "Deutschland", "50"), ("Frankfurt am Main", "Deutschland", "60"), ("Stuttgart", "Deutschland", "70"),
+    ("Düsseldorf", "Deutschland", "40"), ("Leipzig", "Deutschland", "04"), ("Dortmund", "Deutschland", "44"),
+    ("Essen", "Deutschland", "45"), ("Bremen", "Deutschland", "28"), ("Dresden", "Deutschland", "01"),
+    ("Hannover", "Deutschland", "30"), ("Nürnberg", "Deutschland", "90"), ("Freiburg", "Deutschland", "79"),
+    ("Wien", "Österreich", "1"), ("Graz", "Österreich", "8"), ("Zürich", "Schweiz", "80"), ("Basel", "Schweiz", "40")
+]
+STREETS = [
+    "Hauptstraße", "Schulstraße", "Gartenstraße", "Bahnhofstraße", "Dorfstraße", "Bergstraße",
+    "Birkenweg", "Lindenstraße", "Kirchstraße", "Waldstraße", "Ringstraße", "Schillerstraße",
+    "Goethestraße", "Am Markt", "Mühlenweg", "Rosenweg"
+]
+
+
+def generate_persons(count, seed=42, start_id=1):
+    """
+    Reproducible rows for person, kontakt and adresse, ids start at start_id
+    """
+    rnd = random.Random(seed)
+    first_day = date(1930, 1, 1)
+    days = (date(2010, 12, 31) - first_day).days
+    for person_id in range(start_id, start_id + count):
+        vorname = rnd.choice(FIRST_NAMES)
+        nachname = rnd.choice(LAST_NAMES)
+        ort, land, prefix = rnd.choice(CITIES)
+        digits = 4 if land != "Deutschland" else 5
+        plz = prefix + "".join(rnd.choice("0123456789") for _ in range(digits - len(prefix)))
+        # Some persons have no birth date or no phone number
+        geburtsdatum = first_day + timedelta(days=rnd.randrange(days)) if rnd.random() > 0.05 else None
+        yield (
+            {"id": person_id, "vorname": vorname, "nachname": nachname, "geburtsdatum": geburtsdatum},
+            {"person_id": person_id, "email": f"{vorname}.{nachname}{person_id}@example.de".lower(),
+             "telefonnummer": f"01{rnd.randint(50, 79)}{rnd.randint(1000000, 9999999)}" if rnd.random() > 0.2 else None},
+            {"person_id": person_id, "strasse": rnd.choice(STREETS), "hausnummer": str(rnd.randint(1, 200)),
+             "plz": plz, "ort": ort, "land": land}
+        )
+
+
+def seed_database(engine, count, chunk_size=10000, seed=42):
+    """
+    Fills an empty database with count persons, an existing database with
+    exactly count persons is reused. Returns the number of persons.
+    """
+    tables = [Person.__table__, Kontakt.__table__, Adresse.__table__]
+    db.metadata.create_all(engine, tables=tables)
+
+    with engine.connect() as connection:
+        existing = connection.scalar(select(func.count(Person.id)))
+    if existing == count:
+        return existing
+    if existing:
+        raise RuntimeError(f"The database contains {existing} persons, use an empty database or --reseed")
+
+    persons = generate_persons(count, seed)
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), persons)]
+        if not chunk:
+            break
+        with engine.begin() as connection:
+            connection.execute(insert(Person), [person for person, _, _ in chunk])
+            connection.execute(insert(Kontakt), [kontakt for _, kontakt, _ in chunk])
+            connection.execute(insert(Adresse), [adresse for _, _, adresse in chunk])
+
+    # The counters are filled by init_store when the benchmark starts the API
+    if inspect(engine).has_table(Statistik.__tablename__):
+        Statistik.__table__.drop(engine)
+    return count
+
+
+def drop_database(engine):
+    db.metadata.drop_all(engine)
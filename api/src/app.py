@@ -1,20 +1,14 @@
-from os import getenv
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 
-# Azure Key Vault
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
-
 # Own Modules
 from database import db
 from routes import api
-
-def get_secret_from_key_vault(vault_url: str, secret_name: str) -> str:
-    credential = DefaultAzureCredential()
-    client = SecretClient(vault_url=vault_url, credential=credential)
-    return client.get_secret(secret_name).value
+from importer import import_users_command
+from statistics_store import statistics_cli
+from db_pool import engine_options, instrument
+from secret_provider import create_provider
 
 def create_app():
     """
@@ -25,18 +19,26 @@ def create_app():
     cors = CORS(app)
     app.config['CORS_HEADERS'] = 'Content-Type'
 
-    vault_url = getenv('AZURE_KEY_VAULT_URL')
-
-    secret_key = get_secret_from_key_vault(vault_url, 'SECRET-KEY')
-    db_url = get_secret_from_key_vault(vault_url, 'DATABASE-URL')
+    # Both secrets are fetched in parallel with one client, the provider
+    # is kept so later reads within SECRET_CACHE_TTL use its cache
+    provider = create_provider()
+    app.extensions['secrets'] = provider
+    secrets = provider.get_many(['SECRET-KEY', 'DATABASE-URL'])
+    secret_key = secrets['SECRET-KEY']
+    db_url = secrets['DATABASE-URL']
 
     app.config['SECRET_KEY'] = secret_key
     app.config['SQLALCHEMY_DATABASE_URI'] = db_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(db_url)
 
     db.init_app(app)
+    with app.app_context():
+        instrument(db.engine)
 
     app.register_blueprint(api, url_prefix='/api')
+    app.cli.add_command(import_users_command)
+    app.cli.add_command(statistics_cli)
     
     return app
 
@@ -3,27 +3,52 @@ from datetime import date
 # Own Modules
 from data_access import (
     create_user,
-    get_user,
-    get_all_users,
+    create_users,
+    get_user_row,
+    get_user_rows,
+    iter_user_rows,
     update_user,
+    patch_users,
     delete_user,
-    search_user
+    delete_users,
+    count_user_ids,
+    find_user_ids,
+    search_user_rows,
+    ID_CHUNK_SIZE,
+    EXPORT_FIELDS
 )
+from user_cache import user_cache
 
-def bl_create_user(data):
+# Upper bound for one page of /api/users and /api/search
+MAX_PAGE_SIZE = 1000
+
+# Upper bound for one request of /api/users/bulk and the default insert chunk
+MAX_BULK_SIZE = 10000
+BULK_CHUNK_SIZE = 500
+
+# Users a delete by search criteria may remove without confirm
+MAX_CRITERIA_DELETE = 1000
+
+# Fields of PATCH and the ones that must not be emptied
+PATCH_FIELDS = ("vorname", "nachname", "geburtsdatum", "email", "telefonnummer", "strasse", "hausnummer", "plz", "ort", "land")
+REQUIRED_FIELDS = ("vorname", "nachname", "strasse", "plz", "ort", "land")
+SEARCH_CRITERIA = ("vorname", "nachname", "email", "telefonnummer", "strasse", "ort", "land", "plz")
+
+def parse_birth_date(value):
     # To simulate business logic, 
     # checks whether the date of birth is a real date in ISO format
-    geburtsdatum = None
-    if data.get("geburtsdatum"):
-        try:
-            geburtsdatum = date.fromisoformat(data["geburtsdatum"])
-        except ValueError:
-            raise ValueError("Ungültiges Datumsformat für Geburtsdatum (YYYY-MM-DD)")
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError("Ungültiges Datumsformat für Geburtsdatum (YYYY-MM-DD)")
 
-    return create_user(
+def parse_user(data):
+    return dict(
         vorname=data["vorname"],
         nachname=data["nachname"],
-        geburtsdatum=geburtsdatum,
+        geburtsdatum=parse_birth_date(data.get("geburtsdatum")),
         email=data.get("email"),
         telefonnummer=data.get("telefonnummer"),
         strasse=data.get("strasse"),
@@ -33,29 +58,78 @@ def bl_create_user(data):
         land=data.get("land")
     )
 
-def bl_get_user(person_id):
+def bl_create_user(data):
+    return create_user(**parse_user(data))
+
+def bl_create_users_bulk(records, chunk_size=BULK_CHUNK_SIZE):
+    # Validates every record with the rules of bl_create_user,
+    # invalid records are reported and the valid ones inserted
+    if not isinstance(records, list):
+        raise ValueError("A list of users is required.")
+    if len(records) > MAX_BULK_SIZE:
+        raise ValueError(f"At most {MAX_BULK_SIZE} users can be created at once.")
+    if chunk_size < 1 or chunk_size > MAX_BULK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_BULK_SIZE}")
+
+    results = [None] * len(records)
+    valid = []
+    for index, data in enumerate(records):
+        try:
+            valid.append((index, parse_user(data)))
+        except ValueError as e:
+            results[index] = {"index": index, "error": str(e)}
+        except KeyError as e:
+            results[index] = {"index": index, "error": f"Field {e} missing"}
+        except (TypeError, AttributeError):
+            results[index] = {"index": index, "error": "User must be an object"}
+
+    created = create_users([user for _, user in valid], chunk_size)
+    for (index, _), (user_id, error) in zip(valid, created):
+        results[index] = {"index": index, "id": user_id} if error is None else {"index": index, "error": error}
+
+    return results
+
+def bl_get_user(person_id, columns):
     # No real business logic as only get user
-    return get_user(person_id)
+    return get_user_row(person_id, columns)
 
-def bl_get_all_users():
+def bl_get_user_json(person_id, serializer):
+    # Serialized persons are cached per fieldset until they are written
+    body = user_cache.get(person_id, serializer.key)
+    if body is None:
+        # Taken before the read, a write in between keeps the old version out
+        generation = user_cache.generation(person_id)
+        user = bl_get_user(person_id, serializer.columns)
+        if not user:
+            return None
+        body = serializer.dumps(user)
+        user_cache.set(person_id, body, serializer.key, generation)
+    return body
+
+def bl_get_all_users(columns):
     # No real business logic as only get all users
-    return get_all_users()
+    return get_user_rows(columns)
 
-def bl_update_user(person_id, data):
-    # To simulate business logic, 
-    # checks whether the date of birth is a real date in ISO format
-    geburtsdatum = None
-    if data.get("geburtsdatum"):
-        try:
-            geburtsdatum = date.fromisoformat(data["geburtsdatum"])
-        except ValueError:
-            raise ValueError("Ungültiges Datumsformat für Geburtsdatum (YYYY-MM-DD)")
+def bl_get_users_page(columns, limit, after=None):
+    # To simulate business logic,
+    # checks whether the page size and the cursor are in a valid range
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    if after is not None and after < 0:
+        raise ValueError("after must not be negative")
+
+    return get_user_rows(columns, limit, after)
 
-    return update_user(
+def bl_iter_users(columns, chunk_size=MAX_PAGE_SIZE):
+    # No real business logic as only stream all users
+    return iter_user_rows(chunk_size, columns)
+
+def bl_update_user(person_id, data):
+    user = update_user(
         user_id=person_id,
         vorname=data.get("vorname"),
         nachname=data.get("nachname"),
-        geburtsdatum=geburtsdatum,
+        geburtsdatum=parse_birth_date(data.get("geburtsdatum")),
         email=data.get("email"),
         telefonnummer=data.get("telefonnummer"),
         strasse=data.get("strasse"),
@@ -64,24 +138,136 @@ def bl_update_user(person_id, data):
         ort=data.get("ort"),
         land=data.get("land")
     )
+    user_cache.invalidate(person_id)
+    return user
+
+def parse_patch(data):
+    # Only the given fields are changed, null empties an optional field
+    if not isinstance(data, dict):
+        raise ValueError("User must be an object")
+    unknown = set(data) - set(PATCH_FIELDS) - {"id"}
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(sorted(unknown))}")
+
+    changes = {field: data[field] for field in PATCH_FIELDS if field in data}
+    for field in REQUIRED_FIELDS:
+        if field in changes and not changes[field]:
+            raise ValueError(f"{field} must not be empty")
+    if "geburtsdatum" in changes:
+        changes["geburtsdatum"] = parse_birth_date(changes["geburtsdatum"])
+    return changes
+
+def bl_patch_user(person_id, data):
+    missing = patch_users({person_id: parse_patch(data)})
+    user_cache.invalidate(person_id)
+    return not missing
+
+def bl_patch_users(records):
+    # All changes are validated first and written in one transaction
+    if not isinstance(records, list):
+        raise ValueError("A list of users is required.")
+    if len(records) > MAX_BULK_SIZE:
+        raise ValueError(f"At most {MAX_BULK_SIZE} users can be updated at once.")
+
+    changes = {}
+    for index, data in enumerate(records):
+        person_id = data.get("id") if isinstance(data, dict) else None
+        if not isinstance(person_id, int) or isinstance(person_id, bool):
+            raise ValueError(f"User {index} needs an integer id")
+        if person_id in changes:
+            raise ValueError(f"User {person_id} is given more than once")
+        try:
+            changes[person_id] = parse_patch(data)
+        except ValueError as e:
+            raise ValueError(f"User {person_id}: {e}")
+
+    missing = patch_users(changes)
+    for person_id in changes:
+        user_cache.invalidate(person_id)
+    return {"updated": len(changes) - len(missing), "not_found": missing}
 
 def bl_delete_user(person_id):
     # No real business logic as only user will be deleted
-    return delete_user(person_id)
+    deleted = delete_user(person_id)
+    user_cache.invalidate(person_id)
+    return deleted
+
+def delete_matching_users(criteria, chunk_size, dry_run):
+    # The ids are fetched chunk by chunk, never all at once
+    result = {"deleted": 0, "kontakt": 0, "adresse": 0, "not_found": []}
+    after = None
+    while True:
+        person_ids = find_user_ids(chunk_size, after, **criteria)
+        if not person_ids:
+            return result
+        chunk = delete_users(person_ids, chunk_size, dry_run)
+        for key in ("deleted", "kontakt", "adresse"):
+            result[key] += chunk[key]
+        result["not_found"].extend(chunk["not_found"])
+        if not dry_run:
+            for person_id in person_ids:
+                user_cache.invalidate(person_id)
+        after = person_ids[-1]
 
+def bl_delete_users(data, dry_run=False, chunk_size=ID_CHUNK_SIZE, confirm=False):
+    # To simulate business logic,
+    # either ids or at least one search criterion must be given, never both
+    if not isinstance(data, dict):
+        raise ValueError("An object with ids or search criteria is required.")
+    unknown = set(data) - set(SEARCH_CRITERIA) - {"ids"}
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(sorted(unknown))}")
+    if chunk_size < 1 or chunk_size > ID_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {ID_CHUNK_SIZE}")
 
-def bl_search_user(vorname=None, nachname=None, email=None, telefonnummer=None, strasse=None, ort=None, land=None, plz=None):
+    person_ids = data.get("ids")
+    criteria = {field: data[field] for field in SEARCH_CRITERIA if data.get(field)}
+    if person_ids is not None and criteria:
+        raise ValueError("Either ids or search criteria can be specified.")
+    if person_ids is not None:
+        if not isinstance(person_ids, list) or not all(type(person_id) is int for person_id in person_ids):
+            raise ValueError("ids must be a list of integers.")
+        if len(person_ids) > MAX_BULK_SIZE:
+            raise ValueError(f"At most {MAX_BULK_SIZE} users can be deleted at once.")
+        result = delete_users(person_ids, chunk_size, dry_run)
+        if not dry_run:
+            for person_id in person_ids:
+                user_cache.invalidate(person_id)
+    elif criteria:
+        # Criteria match exactly, more than MAX_CRITERIA_DELETE users need confirm
+        matching = count_user_ids(**criteria)
+        if matching > MAX_CRITERIA_DELETE and not dry_run and not confirm:
+            raise ValueError(f"{matching} users match, more than {MAX_CRITERIA_DELETE} are only deleted with confirm.")
+        result = delete_matching_users(criteria, chunk_size, dry_run)
+    else:
+        raise ValueError("ids or at least one search criterion must be specified.")
+
+    result["dry_run"] = dry_run
+    return result
+
+
+def bl_search_user(columns, vorname=None, nachname=None, email=None, telefonnummer=None, strasse=None, ort=None, land=None, plz=None, limit=None):
     # To simulate business logic, 
     # the system checks again whether at least one of the following criteria is filled
     if all(arg is None for arg in [vorname, nachname, email, telefonnummer, strasse, ort, land, plz]):
         raise ValueError("At least one search criterion must be specified.")
+    # Without limit all matches are returned like before
+    if limit is not None and (limit < 1 or limit > MAX_PAGE_SIZE):
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
     
-    return search_user(
+    return search_user_rows(
+        columns,
         vorname=vorname,
         nachname=nachname,
+        email=email,
         telefonnummer=telefonnummer,
         strasse=strasse,
         ort=ort,
         land=land,
-        plz=plz
+        plz=plz,
+        limit=limit
         )
+
+def bl_export_users(**criteria):
+    # No real business logic as only stream users, the search criteria are optional
+    return iter_user_rows(**criteria)
@@ -2,24 +2,70 @@
 Module for generate the PDF statistics
 """
 
-from types import SimpleNamespace
+from os import getenv
 from datetime import datetime, date
-from collections import Counter
 from io import BytesIO
+from collections import OrderedDict
+from threading import Lock
 
 # Third-party modules
 from flask import render_template
-from weasyprint import HTML
 
 # Own Modules
-from data_access import get_all_users
+from person_statistics import calculate_statistics
+from statistics_store import data_version
+
+# Number of rendered PDFs kept in memory
+PDF_CACHE_SIZE = int(getenv("PDF_CACHE_SIZE", "8"))
+
+_pdf_cache = OrderedDict()
+_pdf_cache_lock = Lock()
+# Concurrent requests for the same PDF wait for one render
+_render_lock = Lock()
+
+def statistics_pdf_etag():
+    """
+    The PDF only changes with the data and the report date
+    """
+    return f"{data_version()}-{date.today().isoformat()}"
+
+def cached_pdf(etag):
+    with _pdf_cache_lock:
+        if etag in _pdf_cache:
+            _pdf_cache.move_to_end(etag)
+            return _pdf_cache[etag]
+    return None
+
+def cache_pdf(etag, pdf_data):
+    with _pdf_cache_lock:
+        _pdf_cache[etag] = pdf_data
+        while len(_pdf_cache) > PDF_CACHE_SIZE:
+            _pdf_cache.popitem(last=False)
+
+def get_statistics_pdf(etag):
+    """
+    Returns the PDF for the etag from the cache or renders it
+    """
+    pdf_data = cached_pdf(etag)
+    if pdf_data is not None:
+        return pdf_data
+
+    with _render_lock:
+        pdf_data = cached_pdf(etag)
+        if pdf_data is None:
+            pdf_data = generate_statistics_pdf()
+            cache_pdf(etag, pdf_data)
+
+    return pdf_data
 
 def generate_statistics_pdf():
     """
     Generates statistics and creates a PDF
     """
-    users = get_all_users()
-    stats = calculate_statistics(users)
+    # WeasyPrint and its Pango stack are only loaded by workers that render
+    from weasyprint import HTML
+
+    stats = calculate_statistics()
     current_date = datetime.now().strftime("%d.%m.%Y")
 
     # Rendert html zur Vorbereitung zum pdf
@@ -32,102 +78,3 @@ def generate_statistics_pdf():
     
     return pdf_buffer.getvalue()
 
-
-def calculate_statistics(users):
-    """
-    Calculates various statistics from the list of persons
-    """
-    stats = SimpleNamespace()
-    
-    # Grundlegende Zahlen
-    stats.total_persons = len(users)
-    
-    if stats.total_persons == 0:
-        return stats
-
-    # Kontakt- und Adressdaten
-    stats.persons_with_contact = sum(1 for p in users if p.kontakt is not None)
-    stats.persons_with_address = sum(1 for p in users if p.adresse is not None)
-
-    # Altersberechnung
-    today = date.today()
-    ages = []
-    stats.youngest = None
-    stats.oldest = None
-    stats.youngest_age = float("inf")
-    stats.oldest_age = 0
-
-    for user in users:
-        if user.geburtsdatum:
-            age = today.year - user.geburtsdatum.year
-            if today.month < user.geburtsdatum.month or \
-               (today.month == user.geburtsdatum.month and today.day < user.geburtsdatum.day):
-                age -= 1
-
-            ages.append(age)
-
-            if age < stats.youngest_age:
-                stats.youngest_age = age
-                stats.youngest = user
-
-            if age > stats.oldest_age:
-                stats.oldest_age = age
-                stats.oldest = user
-
-    stats.avg_age = round(sum(ages) / len(ages), 1) if ages else 0
-
-    # Altersverteilung
-    age_groups = {
-        "0-17 Jahre": 0,
-        "18-25 Jahre": 0,
-        "26-35 Jahre": 0,
-        "36-50 Jahre": 0,
-        "51-65 Jahre": 0,
-        "66+ Jahre": 0
-    }
-
-    for age in ages:
-        if age < 18:
-            age_groups["0-17 Jahre"] += 1
-        elif age <= 25:
-            age_groups["18-25 Jahre"] += 1
-        elif age <= 35:
-            age_groups["26-35 Jahre"] += 1
-        elif age <= 50:
-            age_groups["36-50 Jahre"] += 1
-        elif age <= 65:
-            age_groups["51-65 Jahre"] += 1
-        else:
-            age_groups["66+ Jahre"] += 1
-
-    stats.age_distribution = age_groups
-    stats.max_age_group = max(age_groups.values()) if age_groups.values() else 1
-
-    # Häufigste Namen
-    first_names = [p.vorname for p in users if p.vorname]
-    last_names = [p.nachname for p in users if p.nachname]
-
-    stats.common_first_names = Counter(first_names).most_common(10)
-    stats.common_last_names = Counter(last_names).most_common(10)
-    
-    # Geburten nach Monaten
-    month_names = [
-        "Januar", "Februar", "März", "April", "Mai", "Juni",
-        "Juli", "August", "September", "Oktober", "November", "Dezember"
-    ]
-    
-    birth_months = Counter()
-    for user in users:
-        if user.geburtsdatum:
-            month_idx = user.geburtsdatum.month - 1
-            birth_months[month_names[month_idx]] += 1
-
-    total_births = sum(birth_months.values())
-    stats.birth_months = {}
-    
-    for month in month_names:
-        count = birth_months.get(month, 0)
-        percentage = round((count / total_births * 100), 1) if total_births > 0 else 0
-        stats.birth_months[month] = SimpleNamespace(count=count, percentage=percentage)
-
-    return stats
@@ -1,70 +1,325 @@
+from collections import Counter
+
 # Third-party modules
-from sqlalchemy import or_
+from flask import current_app
+from sqlalchemy import or_, and_, select, insert, update, delete, func, case, extract, cast, BigInteger
+from sqlalchemy.exc import SQLAlchemyError
 
 # Own modules
 from database import db
 from models import Person, Kontakt, Adresse
+import search_index
+import statistics_store
+
+def _index_values(user):
+    values = {"vorname": user.vorname, "nachname": user.nachname}
+    if user.kontakt:
+        values.update(email=user.kontakt.email, telefonnummer=user.kontakt.telefonnummer)
+    if user.adresse:
+        values.update(strasse=user.adresse.strasse, ort=user.adresse.ort, land=user.adresse.land, plz=user.adresse.plz)
+    return values
+
+def _index_rows(user_ids=None):
+    # Column projection over the outer joins, no ORM objects are built
+    statement = (
+        select(Person.id, Person.vorname, Person.nachname,
+               Kontakt.email, Kontakt.telefonnummer,
+               Adresse.strasse, Adresse.ort, Adresse.land, Adresse.plz)
+        .outerjoin(Kontakt, Kontakt.person_id == Person.id)
+        .outerjoin(Adresse, Adresse.person_id == Person.id)
+        .execution_options(yield_per=1000)
+    )
+    if user_ids is None:
+        for row in db.session.execute(statement):
+            yield row.id, row._mapping
+        return
+    for ids in _id_chunks(user_ids):
+        for row in db.session.execute(statement.where(Person.id.in_(ids))):
+            yield row.id, row._mapping
+
+def _reindex(user):
+    # A not yet built index reads the new state from the database anyway
+    if search_index.index.is_tracking:
+        search_index.index.add(user.id, _index_values(user))
+
+def _commit_write():
+    # The index knows its own writes, other changes of the data version come from other workers
+    db.session.commit()
+    search_index.index.note_write()
+
+def _insert_users(users):
+    # One multi-row INSERT per table, the person ids come back
+    # in parameter order and are used as foreign keys
+    ids = db.session.scalars(
+        insert(Person).returning(Person.id, sort_by_parameter_order=True),
+        [{"vorname": u["vorname"], "nachname": u["nachname"], "geburtsdatum": u["geburtsdatum"]} for u in users]
+    ).all()
+    db.session.execute(
+        insert(Kontakt),
+        [{"email": u["email"], "telefonnummer": u["telefonnummer"], "person_id": user_id} for user_id, u in zip(ids, users)]
+    )
+    db.session.execute(
+        insert(Adresse),
+        [{"strasse": u["strasse"], "hausnummer": u["hausnummer"], "plz": u["plz"], "ort": u["ort"], "land": u["land"], "person_id": user_id}
+         for user_id, u in zip(ids, users)]
+    )
+
+    deltas = Counter()
+    for u in users:
+        deltas.update(statistics_store.person_deltas(u["vorname"], u["nachname"], u["geburtsdatum"], True, True))
+    statistics_store.record_write(deltas)
+    return ids
 
 def create_user(vorname, nachname, geburtsdatum, email, telefonnummer, strasse, hausnummer, plz, ort, land):
     user = Person(vorname=vorname, nachname=nachname, geburtsdatum=geburtsdatum)
     kontakt = Kontakt(email=email, telefonnummer=telefonnummer, person=user)
     adresse = Adresse(strasse=strasse, hausnummer=hausnummer, plz=plz, ort=ort, land=land, person=user)
     db.session.add(user)
-    db.session.commit()
+    statistics_store.record_write(statistics_store.user_deltas(user))
+    _commit_write()
+    _reindex(user)
     return user.id
 
+def create_users(users, chunk_size=500):
+    """
+    Inserts users given as dicts with the arguments of create_user,
+    one transaction per chunk. Returns (user_id, error) for every user.
+    """
+    results = []
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start:start + chunk_size]
+        try:
+            ids = _insert_users(chunk)
+            _commit_write()
+            results.extend((user_id, None) for user_id in ids)
+        except SQLAlchemyError:
+            db.session.rollback()
+            # Retry one by one to find the records that break the chunk
+            for user in chunk:
+                try:
+                    ids = _insert_users([user])
+                    _commit_write()
+                    results.append((ids[0], None))
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    results.append((None, str(getattr(e, "orig", e))))
+
+    if search_index.index.is_tracking:
+        for (user_id, error), user in zip(results, users):
+            if error is None:
+                search_index.index.add(user_id, user)
+
+    return results
+
 def get_user(user_id):
     return db.session.get(Person, user_id)
 
-def get_all_users():
-    return Person.query.all()
+# Flat columns of a person with contact and address for exports
+EXPORT_COLUMNS = (
+    Person.id, Person.vorname, Person.nachname, Person.geburtsdatum,
+    Kontakt.email, Kontakt.telefonnummer,
+    Adresse.strasse, Adresse.hausnummer, Adresse.plz, Adresse.ort, Adresse.land
+)
+EXPORT_FIELDS = tuple(column.key for column in EXPORT_COLUMNS)
+
+def _user_rows(columns):
+    # Column projection instead of ORM objects, rows are plain tuples,
+    # kontakt and adresse are only joined if a column of them is selected
+    tables = {column.table for column in columns}
+    statement = select(*columns)
+    if Kontakt.__table__ in tables:
+        statement = statement.outerjoin(Kontakt, Kontakt.person_id == Person.id)
+    if Adresse.__table__ in tables:
+        statement = statement.outerjoin(Adresse, Adresse.person_id == Person.id)
+    return statement
+
+def get_user_row(user_id, columns):
+    return db.session.execute(_user_rows(columns).where(Person.id == user_id)).first()
+
+def get_user_rows(columns, limit=None, after=None):
+    statement = _user_rows(columns).order_by(Person.id)
+    if after is not None:
+        statement = statement.where(Person.id > after)
+    if limit:
+        statement = statement.limit(limit)
+    return db.session.execute(statement).all()
+
+def iter_user_rows(chunk_size=1000, columns=EXPORT_COLUMNS, **criteria):
+    # Streamed from a server-side cursor in chunks
+    statement = (
+        _user_rows(columns)
+        .where(*search_filters(**criteria))
+        .order_by(Person.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for partition in db.session.execute(statement).partitions():
+        yield partition
+
+# Columns a PATCH can change, per table
+PATCH_COLUMNS = {
+    Person: ("vorname", "nachname", "geburtsdatum"),
+    Kontakt: ("email", "telefonnummer"),
+    Adresse: ("strasse", "hausnummer", "plz", "ort", "land")
+}
+# Columns a new adresse needs
+ADRESSE_REQUIRED = ("strasse", "plz", "ort", "land")
+# Ids per IN list, stays below the 2100 parameters of SQL Server
+ID_CHUNK_SIZE = 1000
+
+def _id_chunks(user_ids):
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), ID_CHUNK_SIZE):
+        yield user_ids[start:start + ID_CHUNK_SIZE]
+
+def _current_state(user_ids):
+    # Values the counters depend on and the keys of the relations
+    current = {}
+    for ids in _id_chunks(user_ids):
+        statement = (
+            select(Person.id, Person.vorname, Person.nachname, Person.geburtsdatum,
+                   Kontakt.id.label("kontakt_id"), Adresse.id.label("adresse_id"))
+            .outerjoin(Kontakt, Kontakt.person_id == Person.id)
+            .outerjoin(Adresse, Adresse.person_id == Person.id)
+            .where(Person.id.in_(ids))
+        )
+        for row in db.session.execute(statement):
+            current[row.id] = row
+    return current
+
+def _state_deltas(row, sign=1):
+    return statistics_store.person_deltas(
+        row.vorname, row.nachname, row.geburtsdatum, row.kontakt_id is not None, row.adresse_id is not None, sign
+    )
+
+def patch_users(changes):
+    """
+    Partial updates given as {user_id: {column: value}} in one transaction.
+    Only the given columns are written, with one executemany UPDATE per
+    table and set of columns. Returns the ids that do not exist.
+    """
+    current = _current_state(changes)
+    missing = [user_id for user_id in changes if user_id not in current]
+
+    updates = {Person: [], Kontakt: [], Adresse: []}
+    inserts = {Kontakt: [], Adresse: []}
+    deltas = Counter()
+    for user_id, row in current.items():
+        values = changes[user_id]
+        person = {column: values[column] for column in PATCH_COLUMNS[Person] if column in values}
+        if person:
+            updates[Person].append(dict(person, id=user_id))
+
+        for model, key in ((Kontakt, row.kontakt_id), (Adresse, row.adresse_id)):
+            columns = {column: values[column] for column in PATCH_COLUMNS[model] if column in values}
+            if not columns:
+                continue
+            if key is not None:
+                updates[model].append(dict(columns, id=key))
+            elif model is Adresse and any(not columns.get(column) for column in ADRESSE_REQUIRED):
+                raise ValueError(f"User {user_id} has no address, {', '.join(ADRESSE_REQUIRED)} are required")
+            else:
+                inserts[model].append(dict(columns, person_id=user_id))
+
+        # Counters of the old values are removed, the new ones added
+        deltas.update(_state_deltas(row, -1))
+        deltas.update(statistics_store.person_deltas(
+            person.get("vorname", row.vorname), person.get("nachname", row.nachname),
+            person.get("geburtsdatum", row.geburtsdatum),
+            row.kontakt_id is not None or any(column in values for column in PATCH_COLUMNS[Kontakt]),
+            row.adresse_id is not None or any(column in values for column in PATCH_COLUMNS[Adresse])
+        ))
+
+    if not any(updates.values()) and not any(inserts.values()):
+        return missing
+
+    for model, rows in updates.items():
+        if rows:
+            # ORM bulk UPDATE by primary key, rows with the same columns share one statement
+            db.session.execute(update(model), rows)
+    for model, rows in inserts.items():
+        if rows:
+            db.session.execute(insert(model), rows)
+    statistics_store.record_write(deltas)
+    _commit_write()
+
+    if search_index.index.is_tracking:
+        for user_id, values in _index_rows(current):
+            search_index.index.add(user_id, values)
+    return missing
 
 def update_user(user_id, vorname=None, nachname=None, geburtsdatum=None, email=None, telefonnummer=None, strasse=None, hausnummer=None, plz=None, ort=None, land=None):
-    user = get_user(user_id)
-    if not user:
-        return None
+    # Fields that are not given keep their value
+    values = dict(vorname=vorname, nachname=nachname, geburtsdatum=geburtsdatum, email=email,
+                  telefonnummer=telefonnummer, strasse=strasse, hausnummer=hausnummer, plz=plz, ort=ort, land=land)
+    return not patch_users({user_id: {column: value for column, value in values.items() if value is not None}})
 
-    if vorname is not None:
-        user.vorname = vorname
-    if nachname is not None:
-        user.nachname = nachname
-    if geburtsdatum is not None:
-        user.geburtsdatum = geburtsdatum
+def delete_users(user_ids, chunk_size=ID_CHUNK_SIZE, dry_run=False):
+    """
+    Deletes persons with their kontakt and adresse with set-based DELETE
+    statements, one transaction per chunk. Returns the counts and the ids
+    that do not exist, dry_run only counts.
+    """
+    result = {"deleted": 0, "kontakt": 0, "adresse": 0, "not_found": []}
+    user_ids = list(dict.fromkeys(user_ids))
+    for start in range(0, len(user_ids), chunk_size):
+        ids = user_ids[start:start + chunk_size]
+        current = _current_state(ids)
+        result["not_found"].extend(user_id for user_id in ids if user_id not in current)
+        result["deleted"] += len(current)
+        result["kontakt"] += sum(1 for row in current.values() if row.kontakt_id is not None)
+        result["adresse"] += sum(1 for row in current.values() if row.adresse_id is not None)
+        if dry_run or not current:
+            continue
 
-    if user.kontakt:
-        if email is not None:
-            user.kontakt.email = email
-        if telefonnummer is not None:
-            user.kontakt.telefonnummer = telefonnummer
-    else:
-        user.kontakt = Kontakt(email=email, telefonnummer=telefonnummer, person=user)
+        found = list(current)
+        deltas = Counter()
+        for row in current.values():
+            deltas.update(_state_deltas(row, -1))
+        for statement in (delete(Kontakt).where(Kontakt.person_id.in_(found)),
+                          delete(Adresse).where(Adresse.person_id.in_(found)),
+                          delete(Person).where(Person.id.in_(found))):
+            db.session.execute(statement.execution_options(synchronize_session=False))
+        statistics_store.record_write(deltas)
+        _commit_write()
 
-    if user.adresse:
-        if strasse is not None:
-            user.adresse.strasse = strasse
-        if hausnummer is not None:
-            user.adresse.hausnummer = hausnummer
-        if plz is not None:
-            user.adresse.plz = plz
-        if ort is not None:
-            user.adresse.ort = ort
-        if land is not None:
-            user.adresse.land = land
-    else:
-        user.adresse = Adresse(strasse=strasse, hausnummer=hausnummer, plz=plz, ort=ort, land=land, person=user)
+        for user_id in found:
+            search_index.index.remove(user_id)
 
-    db.session.commit()
-    return user
+    return result
 
 def delete_user(user_id):
-    user = get_user(user_id)
-    if user:
-        db.session.delete(user)
-        db.session.commit()
-        return True
-    return False
-
-def search_user(vorname=None, nachname=None, email=None, telefonnummer=None, strasse=None, ort=None, land=None, plz=None):
+    return delete_users([user_id])["deleted"] == 1
+
+def count_user_ids(**criteria):
+    statement = select(func.count(Person.id)).where(*exact_filters(**criteria))
+    return db.session.scalar(statement)
+
+def find_user_ids(limit, after=None, **criteria):
+    # One chunk of the ids matching the criteria exactly, ordered by id
+    statement = select(Person.id).where(*exact_filters(**criteria)).order_by(Person.id).limit(limit)
+    if after is not None:
+        statement = statement.where(Person.id > after)
+    return list(db.session.scalars(statement))
+
+def exact_filters(vorname=None, nachname=None, email=None, telefonnummer=None, strasse=None, ort=None, land=None, plz=None):
+    # Every given field must be equal, unlike the substring search
+    filters = [column == value for column, value in ((Person.vorname, vorname), (Person.nachname, nachname)) if value]
+
+    kontakt_filters = [column == value for column, value in ((Kontakt.email, email), (Kontakt.telefonnummer, telefonnummer)) if value]
+    if kontakt_filters:
+        filters.append(Person.kontakt.has(and_(*kontakt_filters)))
+
+    adresse_filters = [
+        column == value
+        for column, value in ((Adresse.strasse, strasse), (Adresse.ort, ort), (Adresse.land, land), (Adresse.plz, plz))
+        if value
+    ]
+    if adresse_filters:
+        filters.append(Person.adresse.has(and_(*adresse_filters)))
+
+    return filters
+
+def search_filters(vorname=None, nachname=None, email=None, telefonnummer=None, strasse=None, ort=None, land=None, plz=None):
     filters = []
 
     if vorname:
@@ -92,5 +347,126 @@ def search_user(vorname=None, nachname=None, email=None, telefonnummer=None, str
             adresse_filters.append(Adresse.plz.ilike(f"%{plz}%"))
         filters.append(Person.adresse.has(or_(*adresse_filters)))
 
-    results = Person.query.filter(*filters).all()
-    return results
\ No newline at end of file
+    return filters
+
+def _index_loader():
+    app = current_app._get_current_object()
+
+    def load(build):
+        # Own app context, the rebuild can run in a background thread
+        with app.app_context():
+            # Version first, writes between both reads only cause another rebuild
+            version = statistics_store.data_version()
+            build(_index_rows(), version)
+    return load
+
+def _search_index_ids(criteria, limit):
+    # Ranked ids from the search index, None if the index cannot answer
+    if not search_index.ENABLED:
+        return None
+    index = search_index.index
+    load = _index_loader()
+    index.ensure_built(load)
+    if not index.is_current(statistics_store.data_version()):
+        # The database answers until the rebuild in the background is done
+        index.refresh(load)
+        return None
+    return index.search(criteria, limit)
+
+def search_user_rows(columns, limit=None, **criteria):
+    """
+    Rows of the given columns of the persons matching the criteria, ranked
+    by the search index or ordered by id if the database answers
+    """
+    ids = _search_index_ids(criteria, limit)
+    if ids is not None:
+        if not ids:
+            return []
+        rows = {row[0]: row for row in db.session.execute(_user_rows(columns).where(Person.id.in_(ids)))}
+        return [rows[user_id] for user_id in ids if user_id in rows]
+
+    statement = _user_rows(columns).where(*search_filters(**criteria)).order_by(Person.id)
+    if limit:
+        statement = statement.limit(limit)
+    return db.session.execute(statement).all()
+
+def get_person_counts(age_cutoffs, today):
+    """
+    Aggregates persons in one query. age_cutoffs are the latest birth dates
+    of each age group, youngest group first, None for the open last group.
+    The group counts are returned as age_group_0, age_group_1, ...
+    """
+    birth_year = extract("year", Person.geburtsdatum)
+    birth_month = extract("month", Person.geburtsdatum)
+    birth_day = extract("day", Person.geburtsdatum)
+    # Persons whose birthday has not been reached this year yet are one year younger
+    birthday_ahead = or_(birth_month > today.month, and_(birth_month == today.month, birth_day > today.day))
+
+    columns = [
+        func.count(Person.id).label("total_persons"),
+        func.count(Person.geburtsdatum).label("with_birth_date"),
+        # DATEPART and SUM over INT are INT on SQL Server, which overflows at about a million persons
+        func.sum(cast(birth_year, BigInteger)).label("sum_birth_years"),
+        func.sum(case((birthday_ahead, 1), else_=0)).label("birthdays_ahead"),
+        func.min(Person.geburtsdatum).label("oldest_birth_date"),
+        func.max(Person.geburtsdatum).label("youngest_birth_date")
+    ]
+    previous = []
+    for index, cutoff in enumerate(age_cutoffs):
+        if cutoff is None:
+            condition = and_(Person.geburtsdatum.is_not(None), *previous)
+        else:
+            condition = and_(Person.geburtsdatum > cutoff, *previous)
+            previous.append(Person.geburtsdatum <= cutoff)
+        columns.append(func.sum(case((condition, 1), else_=0)).label(f"age_group_{index}"))
+
+    row = db.session.execute(select(*columns)).one()._asdict()
+    row["persons_with_contact"] = db.session.scalar(select(func.count(Kontakt.id)))
+    row["persons_with_address"] = db.session.scalar(select(func.count(Adresse.id)))
+    return row
+
+def get_birth_month_counts():
+    birth_month = extract("month", Person.geburtsdatum)
+    statement = (
+        select(birth_month, func.count(Person.id))
+        .where(Person.geburtsdatum.is_not(None))
+        .group_by(birth_month)
+    )
+    return {int(month): count for month, count in db.session.execute(statement)}
+
+def get_common_names(column, limit=10):
+    statement = (
+        select(column, func.count(Person.id).label("count"))
+        .where(column.is_not(None), column != "")
+        .group_by(column)
+        .order_by(func.count(Person.id).desc(), column)
+        .limit(limit)
+    )
+    return [(name, count) for name, count in db.session.execute(statement)]
+
+def get_location_counts(group, land=None, plz=None, limit=None):
+    """
+    Number of addresses per value of group, an expression over Adresse.
+    land narrows to one country and plz to a postcode prefix.
+    """
+    filters = []
+    if land is not None:
+        filters.append(Adresse.land == land)
+    if plz:
+        filters.append(Adresse.plz.startswith(plz, autoescape=True))
+
+    count = func.count(Adresse.id)
+    statement = (
+        select(group.label("gruppe"), count.label("count"))
+        .where(*filters)
+        .group_by(group)
+        .order_by(count.desc(), group)
+        .limit(limit)
+    )
+    groups = [(gruppe, anzahl) for gruppe, anzahl in db.session.execute(statement)]
+    total = db.session.scalar(select(count).where(*filters))
+    return groups, total
+
+def get_person_by_birth_date(birth_date):
+    return Person.query.filter(Person.geburtsdatum == birth_date).order_by(Person.id).first()
+
@@ -0,0 +1,121 @@
+"""
+Module for the engine options and the metrics of the connection pool
+"""
+
+from os import getenv
+from threading import Lock
+from time import perf_counter
+
+# Third-party modules
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# Connections kept open, extra connections under load and seconds to wait for one
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", "30"))
+# Azure SQL closes idle connections after 30 minutes, recycle them before
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Login timeout of pyodbc in seconds
+DB_CONNECT_TIMEOUT = int(getenv("DB_CONNECT_TIMEOUT", "30"))
+
+
+class PoolMetrics:
+    """
+    Counts the checkouts and the time requests wait for a connection
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def snapshot(self, pool):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            metrics = {
+                "pool": type(pool).__name__,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / attempts, 6) if attempts else None
+            }
+        # Only a QueuePool knows its size and overflow
+        if isinstance(pool, QueuePool):
+            metrics.update(size=pool.size(), checked_out=pool.checkedout(), checked_in=pool.checkedin(),
+                           overflow=max(pool.overflow(), 0), max_overflow=pool._max_overflow)
+        return metrics
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long a checkout waits, including the pre-ping
+    """
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            pool_metrics.record_wait(perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_wait(perf_counter() - start)
+        return connection
+
+
+def engine_options(database_url):
+    """
+    Options for SQLALCHEMY_ENGINE_OPTIONS, SQLite keeps the pool of Flask-SQLAlchemy
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+    if url.get_driver_name() == "pyodbc":
+        options["connect_args"] = {"timeout": DB_CONNECT_TIMEOUT}
+        # Sends the parameters of executemany statements in one round trip
+        options["fast_executemany"] = True
+    return options
+
+
+def instrument(engine):
+    """
+    Counts new and invalidated connections of the engine
+    """
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        pool_metrics.connects += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        pool_metrics.invalidated += 1
@@ -0,0 +1,128 @@
+"""
+Module for importing users from CSV or NDJSON files
+"""
+
+import csv
+import json
+from io import TextIOWrapper
+from itertools import islice
+
+# Third-party modules
+import click
+from flask.cli import with_appcontext
+
+# Own Modules
+from business_logic import parse_user, BULK_CHUNK_SIZE
+from data_access import create_users
+
+FORMATS = ("csv", "ndjson")
+
+# Only the first errors are kept, so a broken file does not fill the memory
+MAX_REPORTED_ERRORS = 100
+
+
+class InvalidRecord:
+    """
+    Stands in for a record that could not be read, it is reported
+    at its offset like every other invalid record
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_records(stream, file_format):
+    """
+    Yields the records of a binary stream one by one
+    """
+    text = TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        for row in csv.DictReader(text):
+            # Empty cells are missing values
+            yield {key: value if value != "" else None for key, value in row.items()}
+    elif file_format == "ndjson":
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield InvalidRecord(f"Invalid JSON: {e}")
+    else:
+        raise ValueError(f"Unknown format {file_format}, use one of {', '.join(FORMATS)}")
+
+
+def validate_records(records, start_offset=0):
+    """
+    Yields (offset, user, error) for every record after start_offset
+    """
+    for offset, data in enumerate(islice(records, start_offset, None), start=start_offset):
+        if isinstance(data, InvalidRecord):
+            yield offset, None, data.error
+            continue
+        try:
+            yield offset, parse_user(data), None
+        except ValueError as e:
+            yield offset, None, str(e)
+        except KeyError as e:
+            yield offset, None, f"Field {e} missing"
+        except (TypeError, AttributeError):
+            yield offset, None, "User must be an object"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_users(stream, file_format, chunk_size=BULK_CHUNK_SIZE, start_offset=0, on_progress=None):
+    """
+    Imports users from a stream in chunks, every chunk is its own transaction.
+    After each chunk on_progress gets the summary, its offset is the
+    start_offset to resume the import with.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    summary = {"offset": start_offset, "created": 0, "failed": 0, "errors": []}
+
+    records = read_records(stream, file_format)
+    for chunk in chunked(validate_records(records, start_offset), chunk_size):
+        valid = [(offset, user) for offset, user, error in chunk if error is None]
+        invalid = [(offset, error) for offset, user, error in chunk if error is not None]
+
+        created = create_users([user for _, user in valid], chunk_size)
+        rejected = [(offset, error) for (offset, _), (_, error) in zip(valid, created) if error is not None]
+        invalid.extend(rejected)
+
+        summary["created"] += len(valid) - len(rejected)
+        summary["failed"] += len(invalid)
+        summary["offset"] = chunk[-1][0] + 1
+        for offset, error in sorted(invalid):
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append({"offset": offset, "error": error})
+
+        if on_progress:
+            on_progress(summary)
+
+    return summary
+
+
+@click.command("import-users")
+@click.argument("file", type=click.File("rb"))
+@click.option("--format", "file_format", type=click.Choice(FORMATS), default=None, help="Defaults to the file extension.")
+@click.option("--chunk-size", type=click.IntRange(min=1), default=BULK_CHUNK_SIZE, show_default=True, help="Users per transaction.")
+@click.option("--offset", "start_offset", type=click.IntRange(min=0), default=0, show_default=True, help="Record to resume the import from.")
+@with_appcontext
+def import_users_command(file, file_format, chunk_size, start_offset):
+    """
+    Import users from a CSV or NDJSON file
+    """
+    if file_format is None:
+        file_format = "csv" if file.name.endswith(".csv") else "ndjson"
+
+    def report(summary):
+        click.echo(f"offset {summary['offset']}: {summary['created']} created, {summary['failed']} failed")
+
+    summary = import_users(file, file_format, chunk_size, start_offset, report)
+    for error in summary["errors"]:
+        click.echo(f"record {error['offset']}: {error['error']}", err=True)
@@ -0,0 +1,93 @@
+"""
+Module for the number of persons per land, postcode prefix and ort
+"""
+
+from os import getenv
+from collections import OrderedDict
+from threading import Lock
+
+# Third-party modules
+from sqlalchemy import func, literal_column
+
+# Own Modules
+from data_access import get_location_counts
+from models import Adresse
+from statistics_store import data_version
+
+# Levels of the drill-down, a land splits into postcode prefixes and those into orte
+LEVELS = ("land", "plz", "ort")
+MAX_PLZ_DIGITS = 5
+DEFAULT_TOP = 10
+MAX_TOP = 1000
+
+# Number of results kept in memory, they are valid until the next write
+LOCATION_CACHE_SIZE = int(getenv("LOCATION_CACHE_SIZE", "64"))
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+
+def _drilldown(level, name, land, digits):
+    # Parameters of the request that splits the group further
+    if level == "land":
+        return {"level": "plz", "land": name, "digits": 1}
+    if level == "plz" and digits < MAX_PLZ_DIGITS:
+        return {"level": "plz", "land": land, "plz": name, "digits": digits + 1}
+    if level == "plz":
+        return {"level": "ort", "land": land, "plz": name}
+    return None
+
+
+def plz_prefix(digits):
+    # Literals, with bound parameters MSSQL does not accept the expression
+    # of the SELECT as the one of the GROUP BY (error 8120)
+    return func.substring(Adresse.plz, literal_column("1"), literal_column(str(int(digits))))
+
+
+def location_statistics(level="land", land=None, plz=None, digits=None, top=DEFAULT_TOP):
+    """
+    Counts of the top groups of a level and the sum of the remaining ones,
+    computed with GROUP BY and cached per data version
+    """
+    if level not in LEVELS:
+        raise ValueError(f"level must be one of {', '.join(LEVELS)}")
+    if top < 1 or top > MAX_TOP:
+        raise ValueError(f"top must be between 1 and {MAX_TOP}")
+    if plz and (len(plz) > MAX_PLZ_DIGITS or not plz.isdigit()):
+        raise ValueError(f"plz must be a prefix of at most {MAX_PLZ_DIGITS} digits")
+    if level == "plz":
+        digits = digits if digits is not None else len(plz or "") + 1
+        if digits <= len(plz or "") or digits > MAX_PLZ_DIGITS:
+            raise ValueError(f"digits must be between {len(plz or '') + 1} and {MAX_PLZ_DIGITS}")
+    else:
+        digits = None
+
+    key = (data_version(), level, land, plz, digits, top)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    group = {"land": Adresse.land, "ort": Adresse.ort}.get(level)
+    if group is None:
+        group = plz_prefix(digits)
+    groups, total = get_location_counts(group, land, plz, top)
+
+    result = {
+        "level": level,
+        "land": land,
+        "plz": plz,
+        "digits": digits,
+        "total": total,
+        "groups": [
+            {"name": name, "count": count, "drilldown": _drilldown(level, name, land, digits)}
+            for name, count in groups
+        ],
+        "other": total - sum(count for _, count in groups)
+    }
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > LOCATION_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,168 @@
+"""
+Module for the request metrics of the API in the Prometheus text format
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+
+# Third-party modules
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.statuses = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.request_size = Histogram(SIZE_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_seconds = 0.0
+
+
+class Metrics:
+    """
+    Metrics of this process per method and route rule
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._routes = {}
+
+    def record(self, method, route, status, seconds, request_size, response_size, queries, sql_seconds):
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.latency.observe(seconds)
+            metrics.request_size.observe(request_size)
+            # Streamed responses have no length
+            if response_size is not None:
+                metrics.response_size.observe(response_size)
+            metrics.queries.observe(queries)
+            metrics.sql_seconds += sql_seconds
+
+    def render(self, gauges=None, counters=None):
+        """
+        Prometheus text format, gauges and counters are additional
+        {name: value} pairs, counter names end with _total
+        """
+        lines = []
+        with self._lock:
+            routes = sorted(self._routes.items())
+
+            lines += ["# HELP sprachbot_http_requests_total Requests per route and status code.",
+                      "# TYPE sprachbot_http_requests_total counter"]
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'sprachbot_http_requests_total{{{_labels(method, route)},status="{status}"}} {count}')
+
+            for name, attribute, help_text in (
+                ("sprachbot_http_request_duration_seconds", "latency", "Time until the response is returned."),
+                ("sprachbot_http_request_size_bytes", "request_size", "Size of the request bodies."),
+                ("sprachbot_http_response_size_bytes", "response_size", "Size of the response bodies."),
+                ("sprachbot_http_request_sql_queries", "queries", "SQL statements executed per request.")
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (method, route), metrics in routes:
+                    lines += getattr(metrics, attribute).lines(name, _labels(method, route))
+
+            lines += ["# HELP sprachbot_sql_duration_seconds_total Time spent in SQL statements.",
+                      "# TYPE sprachbot_sql_duration_seconds_total counter"]
+            for (method, route), metrics in routes:
+                lines.append(f"sprachbot_sql_duration_seconds_total{{{_labels(method, route)}}} {metrics.sql_seconds}")
+
+        for kind, values in (("gauge", gauges), ("counter", counters)):
+            for name, value in sorted((values or {}).items()):
+                if value is not None:
+                    lines += [f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method, route):
+    return f'method="{_escape(method)}",route="{_escape(route)}"'
+
+
+metrics = Metrics()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.metrics_sql_start = perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "metrics_sql_start" in g:
+        g.metrics_sql_queries = g.get("metrics_sql_queries", 0) + 1
+        g.metrics_sql_seconds = g.get("metrics_sql_seconds", 0.0) + perf_counter() - g.pop("metrics_sql_start")
+
+
+def _start_request():
+    g.metrics_start = perf_counter()
+
+
+def _record(status, response_size):
+    if g.get("metrics_recorded") or "metrics_start" not in g:
+        return
+    g.metrics_recorded = True
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.record(
+        request.method, route, status, perf_counter() - g.metrics_start, request.content_length or 0,
+        response_size, g.get("metrics_sql_queries", 0), g.get("metrics_sql_seconds", 0.0)
+    )
+
+
+def _after_request(response):
+    # Measured until the response is returned, streaming is not included
+    _record(response.status_code, response.calculate_content_length())
+    return response
+
+
+def _teardown_request(exception):
+    # Unhandled exceptions skip after_request
+    if exception is not None and "metrics_recorded" not in g:
+        _record(500, None)
+
+
+def instrument_blueprint(blueprint):
+    """
+    Records the metrics of every request to the routes of the blueprint
+    """
+    blueprint.before_request(_start_request)
+    blueprint.after_request(_after_request)
+    blueprint.teardown_request(_teardown_request)
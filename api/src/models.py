@@ -33,4 +33,19 @@ class Adresse(db.Model):
     person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False, unique=True)
 
     def __repr__(self):
-        return f'<Adresse {self.ort}, {self.land}>'
\ No newline at end of file
+        return f'<Adresse {self.ort}, {self.land}>'
+
+class Statistik(db.Model):
+    # Precomputed counters of the person statistics, maintained by statistics_store
+    id = db.Column(db.Integer, primary_key=True)
+    art = db.Column(db.String(20), nullable=False)
+    schluessel = db.Column(db.String(80), nullable=False)
+    anzahl = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('art', 'schluessel'),
+        db.Index('ix_statistik_art_anzahl', 'art', 'anzahl')
+    )
+
+    def __repr__(self):
+        return f'<Statistik {self.art} {self.schluessel}: {self.anzahl}>'
@@ -0,0 +1,177 @@
+"""
+Module for calculating the person statistics in the database
+"""
+
+from types import SimpleNamespace
+from datetime import date
+
+# Own Modules
+from data_access import (
+    get_person_counts,
+    get_birth_month_counts,
+    get_common_names,
+    get_person_by_birth_date
+)
+from models import Person
+import statistics_store
+
+# Label and first age that no longer belongs to the group
+AGE_GROUPS = [
+    ("0-17 Jahre", 18),
+    ("18-25 Jahre", 26),
+    ("26-35 Jahre", 36),
+    ("36-50 Jahre", 51),
+    ("51-65 Jahre", 66),
+    ("66+ Jahre", None)
+]
+
+MONTH_NAMES = [
+    "Januar", "Februar", "März", "April", "Mai", "Juni",
+    "Juli", "August", "September", "Oktober", "November", "Dezember"
+]
+
+
+def age_on(birth_date, today):
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+def latest_birth_date(age, today):
+    """
+    Latest birth date of a person that is at least age years old
+    """
+    try:
+        return today.replace(year=today.year - age)
+    except ValueError:
+        # 29th of February in a year without it
+        return date(today.year - age, 2, 28)
+
+
+def counts_from_queries(cutoffs, today):
+    """
+    Aggregates the persons with queries over the whole table
+    """
+    counts = get_person_counts(cutoffs, today)
+    birth_months = get_birth_month_counts()
+    names = (get_common_names(Person.vorname, 10), get_common_names(Person.nachname, 10))
+    return counts, birth_months, names
+
+
+def counts_from_store(cutoffs, today):
+    """
+    Derives the same numbers from the precomputed counters,
+    the work depends on the number of distinct birth dates only
+    """
+    birth_dates = statistics_store.birth_date_counts()
+    counts = {
+        "total_persons": statistics_store.count(statistics_store.TOTAL),
+        "persons_with_contact": statistics_store.count(statistics_store.CONTACT),
+        "persons_with_address": statistics_store.count(statistics_store.ADDRESS),
+        "with_birth_date": sum(birth_dates.values()),
+        "sum_birth_years": sum(day.year * n for day, n in birth_dates.items()),
+        "birthdays_ahead": sum(n for day, n in birth_dates.items() if (day.month, day.day) > (today.month, today.day)),
+        "youngest_birth_date": max(birth_dates, default=None),
+        "oldest_birth_date": min(birth_dates, default=None)
+    }
+
+    for index in range(len(cutoffs)):
+        counts[f"age_group_{index}"] = 0
+    for day, n in birth_dates.items():
+        index = next(i for i, cutoff in enumerate(cutoffs) if cutoff is None or day > cutoff)
+        counts[f"age_group_{index}"] += n
+
+    birth_months = {}
+    for day, n in birth_dates.items():
+        birth_months[day.month] = birth_months.get(day.month, 0) + n
+
+    names = (statistics_store.most_common(statistics_store.FIRST_NAME, 10),
+             statistics_store.most_common(statistics_store.LAST_NAME, 10))
+    return counts, birth_months, names
+
+
+def calculate_statistics():
+    """
+    Calculates various statistics of all persons, from the precomputed
+    counters if the statistics store is enabled
+    """
+    today = date.today()
+    stats = SimpleNamespace()
+
+    cutoffs = [latest_birth_date(age, today) if age is not None else None for _, age in AGE_GROUPS]
+    source = counts_from_store if statistics_store.ENABLED else counts_from_queries
+    counts, birth_months, (first_names, last_names) = source(cutoffs, today)
+
+    # Grundlegende Zahlen
+    stats.total_persons = counts["total_persons"]
+
+    if stats.total_persons == 0:
+        return stats
+
+    # Kontakt- und Adressdaten
+    stats.persons_with_contact = counts["persons_with_contact"]
+    stats.persons_with_address = counts["persons_with_address"]
+
+    # Altersberechnung
+    with_birth_date = counts["with_birth_date"]
+    stats.youngest = None
+    stats.oldest = None
+    stats.youngest_age = float("inf")
+    stats.oldest_age = 0
+    stats.avg_age = 0
+
+    if with_birth_date:
+        sum_ages = with_birth_date * today.year - counts["sum_birth_years"] - counts["birthdays_ahead"]
+        stats.avg_age = round(sum_ages / with_birth_date, 1)
+
+        stats.youngest = get_person_by_birth_date(counts["youngest_birth_date"])
+        stats.youngest_age = age_on(counts["youngest_birth_date"], today)
+        stats.oldest = get_person_by_birth_date(counts["oldest_birth_date"])
+        stats.oldest_age = age_on(counts["oldest_birth_date"], today)
+
+    # Altersverteilung
+    stats.age_distribution = {
+        label: counts[f"age_group_{index}"] or 0 for index, (label, _) in enumerate(AGE_GROUPS)
+    }
+    stats.max_age_group = max(stats.age_distribution.values()) or 1
+
+    # Häufigste Namen
+    stats.common_first_names = first_names
+    stats.common_last_names = last_names
+
+    # Geburten nach Monaten
+    total_births = sum(birth_months.values())
+    stats.birth_months = {}
+
+    for index, month in enumerate(MONTH_NAMES, start=1):
+        count = birth_months.get(index, 0)
+        percentage = round((count / total_births * 100), 1) if total_births > 0 else 0
+        stats.birth_months[month] = SimpleNamespace(count=count, percentage=percentage)
+
+    return stats
+
+
+def statistics_to_dict(stats):
+    """
+    Converts the statistics into a JSON serializable dict
+    """
+    if stats.total_persons == 0:
+        return {"total_persons": 0}
+
+    def person_to_dict(person, age):
+        if person is None:
+            return None
+        return {"id": person.id, "vorname": person.vorname, "nachname": person.nachname, "age": age}
+
+    return {
+        "total_persons": stats.total_persons,
+        "persons_with_contact": stats.persons_with_contact,
+        "persons_with_address": stats.persons_with_address,
+        "avg_age": stats.avg_age,
+        "youngest": person_to_dict(stats.youngest, stats.youngest_age),
+        "oldest": person_to_dict(stats.oldest, stats.oldest_age),
+        "age_distribution": stats.age_distribution,
+        "common_first_names": [{"name": name, "count": count} for name, count in stats.common_first_names],
+        "common_last_names": [{"name": name, "count": count} for name, count in stats.common_last_names],
+        "birth_months": {
+            month: {"count": data.count, "percentage": data.percentage} for month, data in stats.birth_months.items()
+        }
+    }
@@ -0,0 +1,189 @@
+"""
+Module for rendering the statistics PDF asynchronously on a process pool
+"""
+
+from os import getenv, path
+from datetime import datetime
+from types import SimpleNamespace
+from threading import Lock
+from time import monotonic, perf_counter
+from uuid import uuid4
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# Third-party modules
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+# Own Modules
+from person_statistics import calculate_statistics
+from create_pdf import cached_pdf, cache_pdf, statistics_pdf_etag
+
+# Render processes, jobs waiting or running at most and seconds a finished job is kept
+REPORT_WORKERS = int(getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_SIZE = int(getenv("REPORT_QUEUE_SIZE", "16"))
+REPORT_JOB_TTL = float(getenv("REPORT_JOB_TTL", "600"))
+
+TEMPLATE_FOLDER = path.join(path.dirname(path.abspath(__file__)), "templates")
+
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+# State of a render process, loaded once by _init_worker
+_template = None
+_font_config = None
+
+
+def _init_worker():
+    """
+    Keeps the compiled template and the font configuration for all renders
+    """
+    global _template, _font_config
+    from weasyprint.text.fonts import FontConfiguration
+
+    environment = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape())
+    _template = environment.get_template("pdf_template.html")
+    _font_config = FontConfiguration()
+
+
+def _warm_up():
+    return True
+
+
+def _render(stats, current_date):
+    from weasyprint import HTML
+
+    start = perf_counter()
+    html_content = _template.render(stats=stats, current_date=current_date)
+    pdf_data = HTML(string=html_content).write_pdf(font_config=_font_config)
+    return pdf_data, perf_counter() - start
+
+
+def _picklable(stats):
+    # The template only needs the names of the youngest and oldest person
+    for attribute in ("youngest", "oldest"):
+        person = getattr(stats, attribute, None)
+        if person is not None:
+            setattr(stats, attribute, SimpleNamespace(vorname=person.vorname, nachname=person.nachname))
+    return stats
+
+
+class ReportJobs:
+    """
+    Registry of the render jobs of this API process, jobs and PDFs are
+    not shared with other workers
+    """
+
+    def __init__(self, workers=REPORT_WORKERS, queue_size=REPORT_QUEUE_SIZE, job_ttl=REPORT_JOB_TTL):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.job_ttl = job_ttl
+        self._lock = Lock()
+        self._pool = None
+        self._jobs = {}
+        self.metrics = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "cache_hits": 0,
+                        "render_seconds_total": 0.0, "render_seconds_max": 0.0}
+
+    def start(self):
+        """
+        Starts the render processes, so the first job does not pay the startup
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_context("spawn"), initializer=_init_worker
+                )
+                for _ in range(self.workers):
+                    self._pool.submit(_warm_up)
+        return self._pool
+
+    def submit(self):
+        """
+        Collects the statistics in the request and queues the render,
+        returns the job id
+        """
+        self._expire()
+        etag = statistics_pdf_etag()
+        job = {"id": uuid4().hex, "status": QUEUED, "etag": etag, "created": datetime.now().isoformat(),
+               "finished": None, "render_seconds": None, "error": None, "pdf": cached_pdf(etag), "expires": None}
+
+        if job["pdf"] is not None:
+            self._finish(job, DONE)
+            with self._lock:
+                self.metrics["cache_hits"] += 1
+                self._jobs[job["id"]] = job
+            return job["id"]
+
+        with self._lock:
+            if self.queue_depth() >= self.queue_size:
+                self.metrics["rejected"] += 1
+                raise QueueFullError(f"More than {self.queue_size} reports are in progress.")
+            self._jobs[job["id"]] = job
+            self.metrics["submitted"] += 1
+
+        try:
+            stats = _picklable(calculate_statistics())
+            future = self.start().submit(_render, stats, datetime.now().strftime("%d.%m.%Y"))
+        except Exception as e:
+            # The job is kept as failed, the client sees the error at its status
+            job["error"] = str(e)
+            self._finish(job, FAILED)
+            with self._lock:
+                self.metrics["failed"] += 1
+            return job["id"]
+        future.add_done_callback(lambda done: self._complete(job, done))
+        return job["id"]
+
+    def get(self, job_id):
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_depth(self):
+        # Jobs waiting for or in a render process
+        return sum(1 for job in self._jobs.values() if job["status"] == QUEUED)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = dict(self.metrics, queue_depth=self.queue_depth(), jobs=len(self._jobs), workers=self.workers)
+        rendered = metrics["completed"]
+        metrics["render_seconds_avg"] = round(metrics["render_seconds_total"] / rendered, 3) if rendered > 0 else None
+        return metrics
+
+    def _complete(self, job, future):
+        try:
+            pdf_data, render_seconds = future.result()
+        except Exception as e:
+            job["error"] = str(e)
+            self._finish(job, FAILED)
+            with self._lock:
+                self.metrics["failed"] += 1
+            return
+
+        cache_pdf(job["etag"], pdf_data)
+        job["pdf"] = pdf_data
+        job["render_seconds"] = round(render_seconds, 3)
+        self._finish(job, DONE)
+        with self._lock:
+            self.metrics["completed"] += 1
+            self.metrics["render_seconds_total"] += render_seconds
+            self.metrics["render_seconds_max"] = max(self.metrics["render_seconds_max"], render_seconds)
+
+    def _finish(self, job, status):
+        job["finished"] = datetime.now().isoformat()
+        job["expires"] = monotonic() + self.job_ttl
+        job["status"] = status
+
+    def _expire(self):
+        now = monotonic()
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job["expires"] and job["expires"] < now]:
+                del self._jobs[job_id]
+
+
+report_jobs = ReportJobs()
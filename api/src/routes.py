@@ -1,25 +1,88 @@
+import csv
 from datetime import datetime
+from io import StringIO
 
 # Third-party modules
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, Response, current_app, request, jsonify, make_response, stream_with_context, url_for
 
 # Own Modules
 from business_logic import (
     bl_create_user,
-    bl_get_user,
+    bl_create_users_bulk,
+    bl_get_user_json,
     bl_get_all_users,
+    bl_get_users_page,
+    bl_iter_users,
     bl_update_user,
+    bl_patch_user,
+    bl_patch_users,
     bl_delete_user,
-    bl_search_user
+    bl_delete_users,
+    bl_search_user,
+    bl_export_users,
+    BULK_CHUNK_SIZE,
+    ID_CHUNK_SIZE,
+    EXPORT_FIELDS
 )
-from create_pdf import generate_statistics_pdf
+from create_pdf import get_statistics_pdf, statistics_pdf_etag
+from person_statistics import calculate_statistics, statistics_to_dict
+from location_statistics import location_statistics, DEFAULT_TOP
+from importer import import_users, FORMATS
+from report_jobs import report_jobs, QueueFullError, DONE
+from serializer import UserSerializer, dumps
+from user_cache import user_cache
+from database import db
+from db_pool import pool_metrics
+from metrics import metrics, instrument_blueprint
 
 api = Blueprint("api", __name__)
+instrument_blueprint(api)
+
+def json_response(body, status=200):
+    return Response(body, status=status, mimetype="application/json")
+
+def user_serializer():
+    # Sparse fieldset from ?fields=vorname,nachname,adresse.ort
+    return UserSerializer(request.args.get("fields", default=None, type=str))
+
+def int_arg(name):
+    # A given but malformed number is an error, not a missing parameter
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+def row_to_dict(row):
+    data = row._asdict()
+    if data["geburtsdatum"]:
+        data["geburtsdatum"] = data["geburtsdatum"].isoformat()
+    return data
 
 @api.route("/healthcheck")
 def health_check():
     return jsonify({"status": "running"})
 
+@api.route("/metrics")
+def metrics_route():
+    # Every worker process reports its own requests
+    pool = pool_metrics.snapshot(db.engine.pool)
+    cache = user_cache.stats()
+    gauges = {
+        "sprachbot_db_pool_checked_out": pool.get("checked_out"),
+        "sprachbot_db_pool_overflow": pool.get("overflow"),
+        "sprachbot_report_queue_depth": report_jobs.snapshot()["queue_depth"]
+    }
+    counters = {
+        "sprachbot_db_pool_timeouts_total": pool["timeouts"],
+        "sprachbot_db_pool_wait_seconds_total": pool["wait_seconds_total"],
+        "sprachbot_user_cache_hits_total": cache["hits"],
+        "sprachbot_user_cache_misses_total": cache["misses"]
+    }
+    return Response(metrics.render(gauges, counters), mimetype="text/plain; version=0.0.4")
+
 @api.route("/user", methods=["POST"])
 def create_user_route():
     data = request.get_json()
@@ -31,50 +94,145 @@ def create_user_route():
     except KeyError as e:
         return jsonify({"error": f"Field {e} missing"}), 400
 
+@api.route("/users/bulk", methods=["POST"])
+def create_users_bulk_route():
+    data = request.get_json()
+    chunk_size = request.args.get("chunk_size", default=BULK_CHUNK_SIZE, type=int)
+    try:
+        results = bl_create_users_bulk(data, chunk_size)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    created = sum(1 for result in results if "id" in result)
+    return jsonify({"created": created, "failed": len(results) - created, "results": results})
+
+@api.route("/import", methods=["POST"])
+def import_users_route():
+    # The file is read from the raw request body while it is uploaded
+    args = request.args
+    file_format = args.get("format", default="csv", type=str)
+    chunk_size = args.get("chunk_size", default=BULK_CHUNK_SIZE, type=int)
+    start_offset = args.get("offset", default=0, type=int)
+
+    if file_format not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    if chunk_size < 1 or start_offset < 0:
+        return jsonify({"error": "chunk_size must be positive and offset not negative"}), 400
+
+    progress = {"offset": start_offset}
+
+    def report(summary):
+        progress["offset"] = summary["offset"]
+        current_app.logger.info("Import at offset %s: %s created, %s failed",
+                                summary["offset"], summary["created"], summary["failed"])
+
+    try:
+        summary = import_users(request.stream, file_format, chunk_size, start_offset, report)
+    except (ValueError, csv.Error) as e:
+        # Everything before the offset is committed, the import can resume there
+        return jsonify({"error": str(e), "offset": progress["offset"]}), 400
+    return jsonify(summary)
+
 @api.route("/user/<int:user_id>", methods=["GET"])
 def get_user_route(user_id):
-    user = bl_get_user(user_id)
-    if user:
-        user_data = {
-            "id": user.id,
-            "vorname": user.vorname,
-            "nachname": user.nachname,
-            "geburtsdatum": user.geburtsdatum.isoformat() if user.geburtsdatum else None,
-            "kontakt": {"email": user.kontakt.email, "telefonnummer": user.kontakt.telefonnummer} if user.kontakt else None,
-            "adresse": {"strasse": user.adresse.strasse, "hausnummer": user.adresse.hausnummer, "plz": user.adresse.plz, "ort": user.adresse.ort, "land": user.adresse.land} if user.adresse else None
-        }
-        return jsonify(user_data)
+    try:
+        serializer = user_serializer()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    body = bl_get_user_json(user_id, serializer)
+    if body:
+        return json_response(body)
     return jsonify({"error": "User not found"}), 404
 
+@api.route("/user-cache", methods=["GET"])
+def get_user_cache_route():
+    return jsonify(user_cache.stats())
+
+@api.route("/db-pool", methods=["GET"])
+def get_db_pool_route():
+    return jsonify(pool_metrics.snapshot(db.engine.pool))
+
 @api.route("/users", methods=["GET"])
 def get_all_user_route():
-    users = bl_get_all_users()
-    user_list = []
-    for user in users:
-        user_list.append({
-            "id": user.id,
-            "vorname": user.vorname,
-            "nachname": user.nachname,
-            "geburtsdatum": user.geburtsdatum.isoformat() if user.geburtsdatum else None,
-            "kontakt": {"email": user.kontakt.email, "telefonnummer": user.kontakt.telefonnummer} if user.kontakt else None,
-            "adresse": {"strasse": user.adresse.strasse, "hausnummer": user.adresse.hausnummer, "plz": user.adresse.plz, "ort": user.adresse.ort, "land": user.adresse.land} if user.adresse else None
-        })
-    return jsonify(user_list)
+    args = request.args
+    try:
+        limit = int_arg("limit")
+        after = int_arg("after")
+        serializer = user_serializer()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Opt-in NDJSON streaming, one user per line
+    if args.get("format") == "ndjson":
+        def generate():
+            for chunk in bl_iter_users(serializer.columns):
+                yield serializer.ndjson(chunk)
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    # Keyset pagination, next_after is the cursor for the following page
+    if limit is not None:
+        try:
+            users = bl_get_users_page(serializer.columns, limit, after)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        next_after = users[-1][0] if len(users) == limit else None
+        return json_response(f'{{"users":{serializer.dumps_list(users)},"next_after":{dumps(next_after)}}}')
+
+    users = bl_get_all_users(serializer.columns)
+    return json_response(serializer.dumps_list(users))
 
 @api.route("/user/<int:user_id>", methods=["PUT"])
 def update_user_route(user_id):
     data = request.get_json()
-    updated_user = bl_update_user(user_id, data)
+    try:
+        updated_user = bl_update_user(user_id, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if updated_user:
         return jsonify({"message": f"User with ID {user_id} successfully updated"})
     return jsonify({"error": "User not found"}), 404
 
+@api.route("/user/<int:user_id>", methods=["PATCH"])
+def patch_user_route(user_id):
+    data = request.get_json()
+    try:
+        patched = bl_patch_user(user_id, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if patched:
+        return jsonify({"message": f"User with ID {user_id} successfully updated"})
+    return jsonify({"error": "User not found"}), 404
+
+@api.route("/users", methods=["PATCH"])
+def patch_users_route():
+    # Partial updates of many users, each object needs the id
+    data = request.get_json()
+    try:
+        result = bl_patch_users(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
 @api.route("/user/<int:user_id>", methods=["DELETE"])
 def delete_user_route(user_id):
     if bl_delete_user(user_id):
         return jsonify({"message": f"User with ID {user_id} successfully deleted"})
     return jsonify({"error": "User not found"}), 404
 
+@api.route("/users", methods=["DELETE"])
+def delete_users_route():
+    # Body {"ids": [...]} or search criteria like {"ort": "Berlin"}
+    data = request.get_json()
+    dry_run = request.args.get("dry_run") == "true"
+    chunk_size = request.args.get("chunk_size", default=ID_CHUNK_SIZE, type=int)
+    confirm = request.args.get("confirm") == "true"
+    try:
+        result = bl_delete_users(data, dry_run, chunk_size, confirm)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
 @api.route("/search", methods=["GET"])
 def serarch_user():
     # Get Args
@@ -83,64 +241,156 @@ def serarch_user():
     # Get Parameters from Args
     vorname = args.get("vorname", default=None, type=str)
     nachname = args.get("nachname", default=None, type=str)
+    email = args.get("email", default=None, type=str)
     telefonnummer = args.get("telefonnummer", default=None, type=str)
     strasse = args.get("strasse", default=None, type=str)
     ort = args.get("ort", default=None, type=str)
     land = args.get("land", default=None, type=str)
     plz = args.get("plz", default=None, type=str)
+    try:
+        limit = int_arg("limit")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
+        serializer = user_serializer()
+
         # Search in Business Logic
         users = bl_search_user(
+            serializer.columns,
             vorname=vorname,
             nachname=nachname,
+            email=email,
             telefonnummer=telefonnummer,
             strasse=strasse,
             ort=ort,
             land=land,
-            plz=plz
+            plz=plz,
+            limit=limit
             )
 
         # Create json object
-        user_list = []
-        for user in users:
-            user_list.append({
-                "id": user.id,
-                "vorname": user.vorname,
-                "nachname": user.nachname,
-                "geburtsdatum": user.geburtsdatum.isoformat() if user.geburtsdatum else None,
-                "kontakt": {"email": user.kontakt.email, "telefonnummer": user.kontakt.telefonnummer} if user.kontakt else None,
-                "adresse": {"strasse": user.adresse.strasse, "hausnummer": user.adresse.hausnummer, "plz": user.adresse.plz, "ort": user.adresse.ort, "land": user.adresse.land} if user.adresse else None
-            })
-
-        return jsonify(user_list)
+        return json_response(serializer.dumps_list(users))
     except Exception as e:
         return jsonify({"error": f"{e}"})
 
-@api.route('/download-statistics-pdf')
-def download_statistics_pdf():
+@api.route("/export", methods=["GET"])
+def export_users():
+    args = request.args
+    file_format = args.get("format", default="csv", type=str)
+    criteria = {
+        name: args.get(name, default=None, type=str)
+        for name in ("vorname", "nachname", "email", "telefonnummer", "strasse", "ort", "land", "plz")
+    }
+
+    if file_format == "csv":
+        def generate():
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            for chunk in bl_export_users(**criteria):
+                writer.writerows(chunk)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            # Header only, if no user matches
+            if buffer.tell():
+                yield buffer.getvalue()
+        mimetype = "text/csv"
+    elif file_format == "ndjson":
+        def generate():
+            for chunk in bl_export_users(**criteria):
+                yield "".join(dumps(row_to_dict(row)) + "\n" for row in chunk)
+        mimetype = "application/x-ndjson"
+    else:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=personen_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+    return response
+
+@api.route("/statistics", methods=["GET"])
+def get_statistics_route():
+    return jsonify(statistics_to_dict(calculate_statistics()))
+
+@api.route("/stats/locations", methods=["GET"])
+def get_location_statistics_route():
+    # Drill-down with ?level=land|plz|ort&land=...&plz=...&digits=...&top=...
+    args = request.args
+    try:
+        result = location_statistics(
+            level=args.get("level", default="land", type=str),
+            land=args.get("land", default=None, type=str),
+            plz=args.get("plz", default=None, type=str),
+            digits=args.get("digits", default=None, type=int),
+            top=args.get("top", default=DEFAULT_TOP, type=int)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+def statistics_pdf_response(content_disposition):
+    etag = statistics_pdf_etag()
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        response = make_response(get_statistics_pdf(etag))
+        response.headers['Content-Type'] = 'application/pdf'
+        response.headers['Content-Disposition'] = content_disposition
+
+    response.set_etag(etag)
+    # Browsers have to revalidate, the data can change at any time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@api.route("/reports", methods=["POST"])
+def create_report_route():
     try:
-        pdf_data = generate_statistics_pdf()
-        
-        response = make_response(pdf_data)
+        job_id = report_jobs.submit()
+    except QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+
+    response = jsonify({"id": job_id, "status": report_jobs.get(job_id)["status"]})
+    response.headers['Location'] = url_for("api.get_report_route", job_id=job_id)
+    return response, 202
+
+@api.route("/reports", methods=["GET"])
+def get_report_metrics_route():
+    return jsonify(report_jobs.snapshot())
+
+@api.route("/reports/<job_id>", methods=["GET"])
+def get_report_route(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Report not found"}), 404
+
+    if request.args.get("download") == "true":
+        if job["status"] != DONE:
+            return jsonify({"error": f"Report is {job['status']}"}), 409
+        response = make_response(job["pdf"])
         response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=personenstatistiken_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
+        response.headers['Content-Disposition'] = f'attachment; filename=personenstatistiken_{job_id}.pdf'
         return response
-        
+
+    status = {key: job[key] for key in ("id", "status", "created", "finished", "render_seconds", "error")}
+    if job["status"] == DONE:
+        status["download"] = url_for("api.get_report_route", job_id=job_id, download="true")
+    return jsonify(status)
+
+@api.route('/download-statistics-pdf')
+def download_statistics_pdf():
+    try:
+        return statistics_pdf_response(
+            f'attachment; filename=personenstatistiken_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+        )
     except Exception as e:
         return f"Error when generating the PDF: {str(e)}", 500
 
 @api.route('/view-statistics-pdf')
 def view_statistics_pdf():
     try:
-        pdf_data = generate_statistics_pdf()
-        
-        response = make_response(pdf_data)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = 'inline; filename=personenstatistiken.pdf'
-        
-        return response
-        
+        return statistics_pdf_response('inline; filename=personenstatistiken.pdf')
     except Exception as e:
         return f"Error when generating the PDF: {str(e)}", 500
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""
+Module for the in-memory trigram index behind the user search
+"""
+
+import logging
+from os import getenv
+from threading import Lock, Thread
+from time import monotonic
+
+# Fields of person, kontakt and adresse that can be searched
+PERSON_FIELDS = ("vorname", "nachname")
+KONTAKT_FIELDS = ("email", "telefonnummer")
+ADRESSE_FIELDS = ("strasse", "ort", "land", "plz")
+FIELDS = PERSON_FIELDS + KONTAKT_FIELDS + ADRESSE_FIELDS
+
+# Seconds after which the index is rebuilt from the database in the background
+MAX_AGE = float(getenv("SEARCH_INDEX_MAX_AGE", "300"))
+ENABLED = getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+
+
+def normalize(value):
+    return value.strip().lower() if value else ""
+
+
+def trigrams(value):
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TrigramIndex:
+    """
+    Inverted index from (field, trigram) to person ids.
+    A term is looked up by intersecting the posting lists of its trigrams,
+    starting with the smallest, and verifying the remaining candidates.
+    """
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = Lock()
+        # Only one build at a time, later requests use its result
+        self._build_lock = Lock()
+        self._postings = {}
+        self._documents = {}
+        self._built_at = None
+        # Data version the content belongs to, own writes move it along
+        self.version = None
+        # Writes during a build, replayed on its result
+        self._pending = None
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    @property
+    def is_tracking(self):
+        # Writes have to be passed on while the index is built or being built
+        return self._built_at is not None or self._pending is not None
+
+    def is_current(self, version):
+        """
+        False if the index is older than max_age or the data version
+        moved by writes of another worker since it was built
+        """
+        return self.version == version and monotonic() - self._built_at < self.max_age
+
+    def ensure_built(self, load):
+        """
+        Builds the index on first use, load(build) calls build with the
+        rows and their data version. Concurrent first requests wait for one build.
+        """
+        with self._build_lock:
+            if self._built_at is None:
+                self._build(load)
+
+    def refresh(self, load):
+        """
+        Rebuilds the index in a background thread unless a build is running
+        """
+        if not self._build_lock.acquire(blocking=False):
+            return
+        Thread(target=self._refresh, args=(load,), daemon=True).start()
+
+    def _refresh(self, load):
+        try:
+            self._build(load)
+        except Exception:
+            logging.getLogger(__name__).exception("Rebuilding the search index failed")
+        finally:
+            self._build_lock.release()
+
+    def _build(self, load):
+        with self._lock:
+            self._pending = []
+        try:
+            load(self.build)
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def note_write(self):
+        """
+        Called after an own write committed, the data version moved by one
+        """
+        with self._lock:
+            if self.version is not None:
+                self.version += 1
+
+    def build(self, rows, version=None):
+        """
+        Replaces the index content, rows are (person_id, {field: value}) tuples
+        """
+        postings = {}
+        documents = {}
+        for person_id, values in rows:
+            document = self._document(values)
+            documents[person_id] = document
+            for key in self._keys(document):
+                postings.setdefault(key, set()).add(person_id)
+
+        with self._lock:
+            self._postings = postings
+            self._documents = documents
+            self._built_at = monotonic()
+            self.version = version
+            # The rows may have been read before these writes
+            for person_id, values in self._pending or ():
+                self._remove(person_id)
+                if values is not None:
+                    self._add(person_id, values)
+
+    def add(self, person_id, values):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((person_id, values))
+            self._remove(person_id)
+            self._add(person_id, values)
+
+    def remove(self, person_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((person_id, None))
+            self._remove(person_id)
+
+    def search(self, criteria, limit=None):
+        """
+        Returns the ids of matching persons ranked by match quality,
+        or None if the criteria cannot be answered by the index.
+        Criteria are combined like in data_access.search_filters:
+        person fields with AND, kontakt and adresse fields each with OR.
+        """
+        terms = {field: normalize(value) for field, value in criteria.items() if value}
+        if not terms or any(len(term) < 3 for term in terms.values()):
+            return None
+
+        with self._lock:
+            scores = None
+            for group, combine in ((PERSON_FIELDS, all), (KONTAKT_FIELDS, any), (ADRESSE_FIELDS, any)):
+                group_terms = {field: terms[field] for field in group if field in terms}
+                if not group_terms:
+                    continue
+
+                group_scores = {}
+                for field, term in group_terms.items():
+                    for person_id in self._lookup(field, term):
+                        score = self._score(self._documents[person_id][field], term)
+                        group_scores.setdefault(person_id, []).append(score)
+
+                if combine is all:
+                    group_scores = {pid: s for pid, s in group_scores.items() if len(s) == len(group_terms)}
+
+                if scores is None:
+                    scores = {pid: sum(s) for pid, s in group_scores.items()}
+                else:
+                    scores = {pid: scores[pid] + sum(s) for pid, s in group_scores.items() if pid in scores}
+
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], pid))
+        return ranked[:limit] if limit else ranked
+
+    def _lookup(self, field, term):
+        posting_lists = sorted(
+            (self._postings.get((field, gram), set()) for gram in trigrams(term)),
+            key=len
+        )
+        candidates = set(posting_lists[0])
+        for posting in posting_lists[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+
+        # Trigrams can match in a different order, check the real substring
+        return [pid for pid in candidates if term in self._documents[pid][field]]
+
+    def _add(self, person_id, values):
+        document = self._document(values)
+        self._documents[person_id] = document
+        for key in self._keys(document):
+            self._postings.setdefault(key, set()).add(person_id)
+
+    def _remove(self, person_id):
+        document = self._documents.pop(person_id, None)
+        if document is None:
+            return
+        for key in self._keys(document):
+            posting = self._postings.get(key)
+            if posting is not None:
+                posting.discard(person_id)
+                if not posting:
+                    del self._postings[key]
+
+    @staticmethod
+    def _document(values):
+        return {field: normalize(values.get(field)) for field in FIELDS}
+
+    @staticmethod
+    def _keys(document):
+        for field, value in document.items():
+            for gram in trigrams(value):
+                yield (field, gram)
+
+    @staticmethod
+    def _score(value, term):
+        # Exact matches rank before prefix matches before substring matches
+        if value == term:
+            return 3
+        if value.startswith(term):
+            return 2
+        return 1
+
+
+index = TrigramIndex()
@@ -0,0 +1,164 @@
+"""
+Module for loading the secrets of the API from Key Vault, the environment or a file
+"""
+
+import json
+from os import getenv, getpid, replace
+from threading import Lock
+from time import time
+from concurrent.futures import ThreadPoolExecutor
+
+# "keyvault", "env" or "file", the environment and the file are only used
+# if chosen explicitly, so a missing AZURE_KEY_VAULT_URL is not overlooked
+SECRET_PROVIDER = getenv("SECRET_PROVIDER", "keyvault")
+# JSON object with the secrets for the file provider
+SECRET_FILE = getenv("SECRET_FILE", "secrets.json")
+# Seconds the loaded secrets are reused
+SECRET_CACHE_TTL = float(getenv("SECRET_CACHE_TTL", "3600"))
+# Optional encrypted copy of the secrets for the next start, needs a Fernet key
+SECRET_CACHE_FILE = getenv("SECRET_CACHE_FILE")
+SECRET_CACHE_KEY = getenv("SECRET_CACHE_KEY")
+
+
+class SecretNotFoundError(Exception):
+    pass
+
+
+class KeyVaultProvider:
+    """
+    Reuses one credential and client and fetches several secrets in parallel
+    """
+
+    def __init__(self, vault_url, max_workers=8):
+        if not vault_url:
+            raise SecretNotFoundError(
+                "AZURE_KEY_VAULT_URL is not set, set SECRET_PROVIDER=env or file for local development"
+            )
+        self.vault_url = vault_url
+        self.max_workers = max_workers
+        self._client = None
+        self._lock = Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from azure.identity import DefaultAzureCredential
+                from azure.keyvault.secrets import SecretClient
+
+                self._client = SecretClient(vault_url=self.vault_url, credential=DefaultAzureCredential())
+            return self._client
+
+    def get(self, name):
+        return self.client().get_secret(name).value
+
+    def get_many(self, names):
+        client = self.client()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(names)) or 1) as executor:
+            values = executor.map(lambda name: client.get_secret(name).value, names)
+            return dict(zip(names, values))
+
+
+class EnvProvider:
+    """
+    Reads DATABASE-URL from the variable DATABASE_URL and so on
+    """
+
+    def get(self, name):
+        value = getenv(name.replace("-", "_"))
+        if value is None:
+            raise SecretNotFoundError(f"Environment variable {name.replace('-', '_')} is not set")
+        return value
+
+    def get_many(self, names):
+        return {name: self.get(name) for name in names}
+
+
+class FileProvider:
+    """
+    Reads the secrets from a JSON object, a local stand-in for Key Vault
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def get_many(self, names):
+        with open(self.file_path, encoding="utf-8") as file:
+            secrets = json.load(file)
+        missing = [name for name in names if name not in secrets]
+        if missing:
+            raise SecretNotFoundError(f"Secrets {', '.join(missing)} missing in {self.file_path}")
+        return {name: secrets[name] for name in names}
+
+    def get(self, name):
+        return self.get_many([name])[name]
+
+
+class CachedProvider:
+    """
+    Keeps the secrets of a provider for ttl seconds in memory and,
+    if a cache file and key are given, encrypted on disk
+    """
+
+    def __init__(self, provider, ttl=SECRET_CACHE_TTL, cache_file=None, cache_key=None):
+        self.provider = provider
+        self.ttl = ttl
+        self.cache_file = cache_file if cache_file and cache_key else None
+        self.cache_key = cache_key
+        self._lock = Lock()
+        self._secrets = {}
+        self._expires = 0.0
+
+    def get(self, name):
+        return self.get_many([name])[name]
+
+    def get_many(self, names):
+        with self._lock:
+            if self._expires < time():
+                self._secrets, self._expires = self._read_file()
+            missing = [name for name in names if name not in self._secrets]
+            if missing:
+                self._secrets.update(self.provider.get_many(missing))
+                if not self._expires:
+                    self._expires = time() + self.ttl
+                self._write_file()
+            return {name: self._secrets[name] for name in names}
+
+    def _fernet(self):
+        from cryptography.fernet import Fernet
+
+        return Fernet(self.cache_key)
+
+    def _read_file(self):
+        if not self.cache_file:
+            return {}, 0.0
+        try:
+            with open(self.cache_file, "rb") as file:
+                data = json.loads(self._fernet().decrypt(file.read()))
+        except Exception:
+            # Missing, damaged or written with another key, the secrets are loaded again
+            return {}, 0.0
+        if data["expires"] < time():
+            return {}, 0.0
+        return data["secrets"], data["expires"]
+
+    def _write_file(self):
+        if not self.cache_file:
+            return
+        token = self._fernet().encrypt(json.dumps({"expires": self._expires, "secrets": self._secrets}).encode())
+        # Written next to the file and renamed, parallel workers never read half a file
+        temporary = f"{self.cache_file}.{getpid()}"
+        with open(temporary, "wb") as file:
+            file.write(token)
+        replace(temporary, self.cache_file)
+
+
+def create_provider(name=SECRET_PROVIDER):
+    if name == "keyvault":
+        provider = KeyVaultProvider(getenv("AZURE_KEY_VAULT_URL"))
+    elif name == "env":
+        provider = EnvProvider()
+    elif name == "file":
+        provider = FileProvider(SECRET_FILE)
+    else:
+        raise ValueError(f"Unknown SECRET_PROVIDER {name}")
+    return CachedProvider(provider, SECRET_CACHE_TTL, SECRET_CACHE_FILE, SECRET_CACHE_KEY)
@@ -0,0 +1,111 @@
+"""
+Module for serializing person rows to JSON
+"""
+
+from json import JSONEncoder
+
+# Own Modules
+from models import Person, Kontakt, Adresse
+
+# Selectable fields, nested fields are addressed as relation.field
+PERSON_FIELDS = {
+    "vorname": Person.vorname,
+    "nachname": Person.nachname,
+    "geburtsdatum": Person.geburtsdatum
+}
+RELATION_FIELDS = {
+    "kontakt": {
+        "email": Kontakt.email,
+        "telefonnummer": Kontakt.telefonnummer
+    },
+    "adresse": {
+        "strasse": Adresse.strasse,
+        "hausnummer": Adresse.hausnummer,
+        "plz": Adresse.plz,
+        "ort": Adresse.ort,
+        "land": Adresse.land
+    }
+}
+# A person without kontakt or adresse is serialized with null like before
+RELATION_KEYS = {"kontakt": Kontakt.id, "adresse": Adresse.id}
+
+# Created once, the C accelerated encoder is used for every response,
+# keys are sorted like jsonify did before
+_encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+class UserSerializer:
+    """
+    Selects the columns for a sparse fieldset and turns the result rows
+    into JSON. fields is a comma separated list like
+    "vorname,nachname,adresse.ort", "adresse" selects the whole relation.
+    """
+
+    def __init__(self, fields=None):
+        person_fields, relation_fields = self._parse(fields)
+        # Same for every spelling of the same fieldset, used as cache key
+        self.key = ",".join(person_fields + [
+            f"{relation}.{name}" for relation, names in relation_fields.items() for name in names
+        ])
+
+        self.columns = [Person.id]
+        self._person = []
+        for name in person_fields:
+            self._person.append((name, len(self.columns), name == "geburtsdatum"))
+            self.columns.append(PERSON_FIELDS[name])
+
+        self._relations = []
+        for relation, names in relation_fields.items():
+            key_index = len(self.columns)
+            self.columns.append(RELATION_KEYS[relation])
+            indexes = []
+            for name in names:
+                indexes.append((name, len(self.columns)))
+                self.columns.append(RELATION_FIELDS[relation][name])
+            self._relations.append((relation, key_index, indexes))
+
+    @staticmethod
+    def _parse(fields):
+        if not fields:
+            return list(PERSON_FIELDS), {relation: list(names) for relation, names in RELATION_FIELDS.items()}
+
+        person_fields = []
+        relation_fields = {}
+        for field in (field.strip() for field in fields.split(",")):
+            relation, _, name = field.partition(".")
+            if field == "id":
+                continue
+            if field in PERSON_FIELDS:
+                person_fields.append(field)
+            elif relation in RELATION_FIELDS and not name:
+                relation_fields[relation] = list(RELATION_FIELDS[relation])
+            elif relation in RELATION_FIELDS and name in RELATION_FIELDS[relation]:
+                selected = relation_fields.setdefault(relation, [])
+                if name not in selected:
+                    selected.append(name)
+            else:
+                raise ValueError(f"Unknown field {field}")
+
+        return list(dict.fromkeys(person_fields)), relation_fields
+
+    def to_dict(self, row):
+        data = {"id": row[0]}
+        for name, index, is_date in self._person:
+            value = row[index]
+            data[name] = value.isoformat() if is_date and value else value
+        for relation, key_index, indexes in self._relations:
+            data[relation] = {name: row[index] for name, index in indexes} if row[key_index] is not None else None
+        return data
+
+    def dumps(self, row):
+        return _encoder.encode(self.to_dict(row))
+
+    def dumps_list(self, rows):
+        return "[" + ",".join(self.dumps(row) for row in rows) + "]"
+
+    def ndjson(self, rows):
+        return "".join(self.dumps(row) + "\n" for row in rows)
+
+
+def dumps(value):
+    return _encoder.encode(value)
@@ -0,0 +1,281 @@
+"""
+Module for the incrementally maintained statistics counters
+"""
+
+from os import getenv
+from random import randrange
+from collections import Counter
+from datetime import date
+
+# Third-party modules
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select, update, insert, delete, func, inspect, bindparam
+from sqlalchemy.exc import IntegrityError
+
+# Own Modules
+from database import db
+from models import Person, Kontakt, Adresse, Statistik
+
+# Reads the statistics from the counters instead of aggregating the persons
+ENABLED = getenv("STATISTICS_STORE_ENABLED", "true").lower() == "true"
+
+# Kinds of counters, "personen", "kontakt", "adresse" and "version" have the empty key
+VERSION = "version"
+TOTAL = "personen"
+CONTACT = "kontakt"
+ADDRESS = "adresse"
+BIRTH_DATE = "geburtsdatum"
+FIRST_NAME = "vorname"
+LAST_NAME = "nachname"
+
+# Every write changes these counters, they are split into rows keyed
+# by the shard number so concurrent writes do not wait for one row
+SHARDED = (VERSION, TOTAL, CONTACT, ADDRESS)
+STATISTICS_SHARDS = int(getenv("STATISTICS_SHARDS", "8"))
+
+# Keys per IN list when the existing counters are looked up,
+# MSSQL allows at most 2100 parameters per statement
+KEY_CHUNK_SIZE = 1000
+
+# Core statements, executed with a list of parameters as one executemany
+_table = Statistik.__table__
+_INCREMENT = (
+    update(_table)
+    .where(_table.c.art == bindparam("b_art"), _table.c.schluessel == bindparam("b_schluessel"))
+    .values(anzahl=_table.c.anzahl + bindparam("b_delta"))
+)
+
+
+def init_store():
+    """
+    Creates the counter table and fills it from the persons, a deploy step
+    that runs once and not in every worker. Returns False if it exists.
+    """
+    if inspect(db.engine).has_table(Statistik.__tablename__):
+        return False
+    Statistik.__table__.create(db.engine)
+    reconcile()
+    return True
+
+
+def person_deltas(vorname, nachname, geburtsdatum, has_contact, has_address, sign=1):
+    """
+    Counter changes for adding (sign=1) or removing (sign=-1) one person
+    """
+    deltas = Counter({(TOTAL, ""): sign})
+    if has_contact:
+        deltas[(CONTACT, "")] += sign
+    if has_address:
+        deltas[(ADDRESS, "")] += sign
+    if geburtsdatum:
+        deltas[(BIRTH_DATE, geburtsdatum.isoformat())] += sign
+    if vorname:
+        deltas[(FIRST_NAME, vorname)] += sign
+    if nachname:
+        deltas[(LAST_NAME, nachname)] += sign
+    return deltas
+
+
+def user_deltas(user, sign=1):
+    return person_deltas(user.vorname, user.nachname, user.geburtsdatum,
+                         user.kontakt is not None, user.adresse is not None, sign)
+
+
+def apply(deltas):
+    """
+    Adds the deltas to the counters in the current transaction, the existing
+    counters with one UPDATE and the missing ones with one INSERT
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    existing = _existing_keys(deltas)
+    updates = [
+        {"b_art": art, "b_schluessel": schluessel, "b_delta": delta}
+        for (art, schluessel), delta in deltas.items() if (art, schluessel) in existing
+    ]
+    if updates:
+        db.session.execute(_INCREMENT, updates)
+
+    missing = [
+        {"art": art, "schluessel": schluessel, "anzahl": delta}
+        for (art, schluessel), delta in deltas.items() if (art, schluessel) not in existing
+    ]
+    if not missing:
+        return
+    try:
+        # Savepoint, a concurrent insert of the same key must not
+        # roll back the transaction of the person
+        with db.session.begin_nested():
+            db.session.execute(insert(_table), missing)
+    except IntegrityError:
+        for row in missing:
+            _apply_one(row["art"], row["schluessel"], row["anzahl"])
+
+
+def _existing_keys(keys):
+    """
+    Keys of the counters that exist, locked until the end of the
+    transaction so reconcile does not delete them in between
+    """
+    by_art = {}
+    for art, schluessel in keys:
+        by_art.setdefault(art, []).append(schluessel)
+
+    existing = set()
+    for art, values in by_art.items():
+        for start in range(0, len(values), KEY_CHUNK_SIZE):
+            statement = (
+                select(_table.c.schluessel)
+                .where(_table.c.art == art, _table.c.schluessel.in_(values[start:start + KEY_CHUNK_SIZE]))
+                .with_for_update()
+            )
+            existing.update((art, schluessel) for schluessel in db.session.scalars(statement))
+    return existing
+
+
+def _apply_one(art, schluessel, delta):
+    # Fallback after a concurrent insert of one of the keys
+    if _increment(art, schluessel, delta):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(_table).values(art=art, schluessel=schluessel, anzahl=delta))
+    except IntegrityError:
+        _increment(art, schluessel, delta)
+
+
+def record_write(deltas):
+    """
+    Applies the counter deltas of a write and bumps the data version
+    """
+    deltas[(VERSION, "")] += 1
+    shard = str(randrange(STATISTICS_SHARDS))
+    apply(Counter({
+        (art, shard if art in SHARDED else schluessel): delta
+        for (art, schluessel), delta in deltas.items()
+    }))
+
+
+def data_version():
+    # Changes with every write, caches of derived data are keyed by it
+    return count(VERSION)
+
+
+def _increment(art, schluessel, delta):
+    result = db.session.execute(
+        update(Statistik)
+        .where(Statistik.art == art, Statistik.schluessel == schluessel)
+        .values(anzahl=Statistik.anzahl + delta)
+    )
+    return result.rowcount > 0
+
+
+def count(art):
+    # Sum of the shards
+    return db.session.scalar(select(func.sum(Statistik.anzahl)).where(Statistik.art == art)) or 0
+
+
+def birth_date_counts():
+    statement = select(Statistik.schluessel, Statistik.anzahl).where(Statistik.art == BIRTH_DATE, Statistik.anzahl > 0)
+    return {date.fromisoformat(schluessel): anzahl for schluessel, anzahl in db.session.execute(statement)}
+
+
+def most_common(art, limit=10):
+    statement = (
+        select(Statistik.schluessel, Statistik.anzahl)
+        .where(Statistik.art == art, Statistik.anzahl > 0)
+        .order_by(Statistik.anzahl.desc(), Statistik.schluessel)
+        .limit(limit)
+    )
+    return [(schluessel, anzahl) for schluessel, anzahl in db.session.execute(statement)]
+
+
+def expected_counters():
+    """
+    Recomputes all counters from the persons with aggregate queries
+    """
+    counters = Counter()
+    counters[(TOTAL, "")] = db.session.scalar(select(func.count(Person.id)))
+    counters[(CONTACT, "")] = db.session.scalar(select(func.count(Kontakt.id)))
+    counters[(ADDRESS, "")] = db.session.scalar(select(func.count(Adresse.id)))
+
+    for art, column in ((BIRTH_DATE, Person.geburtsdatum), (FIRST_NAME, Person.vorname), (LAST_NAME, Person.nachname)):
+        statement = select(column, func.count(Person.id)).where(column.is_not(None)).group_by(column)
+        for value, anzahl in db.session.execute(statement):
+            if value:
+                key = value.isoformat() if art == BIRTH_DATE else value
+                counters[(art, key)] = anzahl
+
+    return counters
+
+
+def differences():
+    """
+    Consistency check, returns the deltas that make the stored counters correct
+    """
+    # The persons first, under SERIALIZABLE a write that already changed them
+    # is waited for and then also found in the counters
+    expected = expected_counters()
+    statement = select(Statistik.art, Statistik.schluessel, Statistik.anzahl).where(Statistik.art != VERSION)
+    stored = Counter()
+    for art, schluessel, anzahl in db.session.execute(statement):
+        stored[(art, "" if art in SHARDED else schluessel)] += anzahl
+    return Counter({
+        key: expected.get(key, 0) - stored.get(key, 0)
+        for key in stored.keys() | expected.keys()
+        if expected.get(key, 0) != stored.get(key, 0)
+    })
+
+
+def reconcile():
+    """
+    Corrects the stored counters and removes the ones that dropped to zero.
+    Runs serializable, otherwise a write committed between reading and
+    applying the differences would be counted twice.
+    """
+    db.session.commit()
+    db.session.connection(execution_options={"isolation_level": "SERIALIZABLE"})
+    deltas = differences()
+    apply(deltas)
+    db.session.execute(delete(Statistik).where(Statistik.anzahl == 0))
+    db.session.commit()
+    return deltas
+
+
+statistics_cli = AppGroup("statistics", help="Maintain the precomputed statistics.")
+
+
+@statistics_cli.command("init")
+def init_command():
+    """
+    Create and fill the counter table, run this once on deploy
+    """
+    if init_store():
+        click.echo("Statistics table created")
+    else:
+        click.echo("Statistics table exists")
+
+
+@statistics_cli.command("reconcile")
+def reconcile_command():
+    """
+    Recompute the counters from the persons, run this periodically
+    """
+    deltas = reconcile()
+    click.echo(f"{len(deltas)} counters corrected")
+
+
+@statistics_cli.command("check")
+def check_command():
+    """
+    Compare the counters with the persons, exits with 1 on differences
+    """
+    deltas = differences()
+    for (art, schluessel), delta in sorted(deltas.items()):
+        click.echo(f"{art} {schluessel!r}: {delta:+d}")
+    if deltas:
+        raise SystemExit(1)
+    click.echo("Statistics are consistent")
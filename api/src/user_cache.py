@@ -0,0 +1,212 @@
+"""
+Module for caching serialized persons of GET /api/user/<id>
+"""
+
+from os import getenv
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+# "memory" keeps the entries in this process, "redis://..." shares them
+# between workers, "none" disables the cache
+USER_CACHE_BACKEND = getenv("USER_CACHE_BACKEND", "memory")
+USER_CACHE_SIZE = int(getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(getenv("USER_CACHE_TTL", "60"))
+
+
+class MemoryBackend:
+    """
+    LRU with a time to live, every person holds the variants of its fieldsets.
+    Only the writes of this process invalidate it, with several workers
+    the others serve an old version until USER_CACHE_TTL has passed.
+    """
+
+    def __init__(self, max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        # Counter value of the last invalidation per person, ids dropped
+        # from it count as invalidated at _floor
+        self._counter = 0
+        self._floor = 0
+        self._invalidated = OrderedDict()
+
+    def get(self, user_id, variant):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, variants = entry
+            if expires < monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return variants.get(variant)
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._counter
+
+    def set(self, user_id, variant, value, generation=None):
+        with self._lock:
+            # Invalidated while the value was read, it may be old
+            if generation is not None and self._invalidated.get(user_id, self._floor) > generation:
+                return
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < monotonic():
+                entry = (monotonic() + self.ttl, {})
+                self._entries[user_id] = entry
+            entry[1][variant] = value
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._counter += 1
+            self._invalidated[user_id] = self._counter
+            self._invalidated.move_to_end(user_id)
+            while len(self._invalidated) > self.max_size:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Shared cache for several workers, one hash with the variants per person
+    and a generation counter that every invalidation increments
+    """
+
+    # Stores the variant only if the generation did not change since the read,
+    # the time to live is set when the hash is created (works before Redis 7)
+    SET_SCRIPT = """
+    if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+    if redis.call('TTL', KEYS[1]) < 0 then
+        redis.call('EXPIRE', KEYS[1], ARGV[4])
+    end
+    return 1
+    """
+    # Seconds a generation is kept, far longer than any read of a person
+    GENERATION_TTL = 86400
+
+    def __init__(self, url, ttl=USER_CACHE_TTL):
+        try:
+            from redis import Redis
+        except ImportError:
+            raise RuntimeError("USER_CACHE_BACKEND is a redis URL, but the redis package is not installed")
+
+        self.ttl = ttl
+        self._client = Redis.from_url(url)
+        self._set = self._client.register_script(self.SET_SCRIPT)
+
+    @staticmethod
+    def _key(user_id):
+        return f"sprachbot:user:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id):
+        return f"sprachbot:user:{user_id}:generation"
+
+    def get(self, user_id, variant):
+        value = self._client.hget(self._key(user_id), variant)
+        return value.decode() if value is not None else None
+
+    def generation(self, user_id):
+        value = self._client.get(self._generation_key(user_id))
+        return value.decode() if value is not None else ""
+
+    def set(self, user_id, variant, value, generation=None):
+        if generation is None:
+            generation = self.generation(user_id)
+        self._set(keys=[self._key(user_id), self._generation_key(user_id)],
+                  args=[generation, variant, value, int(self.ttl)])
+
+    def delete(self, user_id):
+        generation_key = self._generation_key(user_id)
+        pipeline = self._client.pipeline()
+        pipeline.incr(generation_key)
+        pipeline.expire(generation_key, self.GENERATION_TTL)
+        pipeline.delete(self._key(user_id))
+        pipeline.execute()
+
+    def size(self):
+        return None
+
+
+class NoBackend:
+    def get(self, user_id, variant):
+        return None
+
+    def generation(self, user_id):
+        return None
+
+    def set(self, user_id, variant, value, generation=None):
+        pass
+
+    def delete(self, user_id):
+        pass
+
+    def size(self):
+        return 0
+
+
+def create_backend(name=USER_CACHE_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "none":
+        return NoBackend()
+    if name.startswith(("redis://", "rediss://")):
+        return RedisBackend(name)
+    raise ValueError(f"Unknown USER_CACHE_BACKEND {name}")
+
+
+class UserCache:
+    """
+    Counts hits and misses in front of a backend
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, variant=""):
+        value = self.backend.get(user_id, variant)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def generation(self, user_id):
+        """
+        Token to take before the person is read, set ignores the value
+        if the person was invalidated in between
+        """
+        return self.backend.generation(user_id)
+
+    def set(self, user_id, value, variant="", generation=None):
+        self.backend.set(user_id, variant, value, generation)
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else None,
+            "size": self.backend.size()
+        }
+
+
+user_cache = UserCache(create_backend())
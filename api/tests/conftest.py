@@ -0,0 +1,73 @@
+import sys
+from os import environ, path
+
+# The API modules are flat modules in api/src
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), "src"))
+
+# Secrets from the environment and an in-memory database for every app
+environ.setdefault("SECRET_PROVIDER", "env")
+environ.setdefault("SECRET_KEY", "test")
+environ.setdefault("DATABASE_URL", "sqlite://")
+
+# Third-party modules
+import pytest
+from sqlalchemy import event
+
+# Own Modules
+from app import create_app
+from database import db
+from data_access import create_users
+from user_cache import user_cache, MemoryBackend
+import search_index
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # The index and the cache live in the module, every test starts empty
+    monkeypatch.setattr(search_index, "index", search_index.TrigramIndex())
+    monkeypatch.setattr(user_cache, "backend", MemoryBackend())
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def queries(app):
+    """
+    SQL statements executed while the test runs
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", record)
+
+
+def user(number):
+    return {
+        "vorname": f"Max{number % 7}", "nachname": f"Mustermann{number}", "geburtsdatum": None,
+        "email": f"max{number}@example.de", "telefonnummer": f"0171{number:07d}",
+        "strasse": "Hauptstraße", "hausnummer": str(number), "plz": f"{10115 + number}",
+        "ort": ("Berlin", "München", "Köln")[number % 3], "land": "Deutschland"
+    }
+
+
+@pytest.fixture
+def seed(app):
+    """
+    Inserts users with numbers start to start + count - 1
+    """
+    def seed(count, start=0):
+        create_users([user(number) for number in range(start, start + count)])
+    return seed
@@ -0,0 +1,31 @@
+import business_logic
+
+
+def test_criteria_match_exactly(client, seed):
+    seed(12)
+    # Mustermann1 is also a substring of Mustermann10 and Mustermann11
+    result = client.delete("/api/users", json={"nachname": "Mustermann1"}).get_json()
+    assert result["deleted"] == 1
+    assert client.get("/api/user/2").status_code == 404
+    assert len(client.get("/api/users").get_json()) == 11
+
+
+def test_all_criteria_must_match(client, seed):
+    seed(6)
+    result = client.delete("/api/users", json={"ort": "Berlin", "plz": "10115"}).get_json()
+    assert result["deleted"] == 1
+
+
+def test_large_delete_needs_confirm(client, seed, monkeypatch):
+    monkeypatch.setattr(business_logic, "MAX_CRITERIA_DELETE", 2)
+    seed(9)
+
+    response = client.delete("/api/users", json={"ort": "Berlin"})
+    assert response.status_code == 400
+    assert "3 users match" in response.get_json()["error"]
+    assert client.delete("/api/users?dry_run=true", json={"ort": "Berlin"}).get_json()["deleted"] == 3
+
+    result = client.delete("/api/users?confirm=true&chunk_size=2", json={"ort": "Berlin"}).get_json()
+    assert result["deleted"] == 3
+    assert result["kontakt"] == 3
+    assert len(client.get("/api/users").get_json()) == 6
@@ -0,0 +1,15 @@
+import sys
+from os import path
+
+# The measurement is shared with the report in api/benchmark
+sys.path.insert(0, path.join(path.dirname(path.dirname(path.abspath(__file__))), "benchmark"))
+
+from import_time import measure_imports, report, IMPORT_TIME_BUDGET
+
+
+def test_cold_import_of_app_is_within_budget():
+    modules, total = measure_imports("app")
+    details = "\n".join(report(modules, 15))
+    assert total <= IMPORT_TIME_BUDGET, f"Import of app took {total:.3f}s, budget {IMPORT_TIME_BUDGET:.3f}s\n{details}"
+    # WeasyPrint is only loaded when a PDF is rendered
+    assert not [name for name in modules if name.split(".")[0] == "weasyprint"]
@@ -0,0 +1,44 @@
+from importer import import_users_command
+
+
+def test_import_rejects_chunk_size_zero(app, tmp_path):
+    file = tmp_path / "users.csv"
+    file.write_text("vorname,nachname\nMax,Mustermann\n", encoding="utf-8")
+
+    result = app.test_cli_runner().invoke(import_users_command, [str(file), "--chunk-size", "0"])
+
+    assert result.exit_code == 2
+    assert "--chunk-size" in result.output
+
+
+def test_import_command(app, client, tmp_path):
+    file = tmp_path / "users.csv"
+    file.write_text(
+        "vorname,nachname,strasse,plz,ort,land\n"
+        "Max,Mustermann,Hauptstraße,10115,Berlin,Deutschland\n"
+        "Erika,Musterfrau,Ring,50667,Köln,Deutschland\n",
+        encoding="utf-8"
+    )
+
+    result = app.test_cli_runner().invoke(import_users_command, [str(file), "--chunk-size", "1"])
+
+    assert result.exit_code == 0, result.output
+    assert len(client.get("/api/users").get_json()) == 2
+
+
+def test_malformed_ndjson_line_is_reported_and_skipped(client):
+    body = (
+        '{"vorname": "Max", "nachname": "Mustermann", "strasse": "Hauptstraße", "plz": "10115", "ort": "Berlin", "land": "Deutschland"}\n'
+        '{"vorname": "Erika",\n'
+        '{"vorname": "Erika", "nachname": "Musterfrau", "strasse": "Ring", "plz": "50667", "ort": "Köln", "land": "Deutschland"}\n'
+    )
+
+    response = client.post("/api/import?format=ndjson", data=body.encode())
+
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary["created"] == 2
+    assert summary["failed"] == 1
+    assert summary["offset"] == 3
+    assert summary["errors"][0]["offset"] == 1
+    assert summary["errors"][0]["error"].startswith("Invalid JSON")
@@ -0,0 +1,21 @@
+from sqlalchemy import select, func
+from sqlalchemy.dialects import mssql
+
+from location_statistics import plz_prefix
+
+
+def test_postcode_prefix_is_grouped_with_literals(client, seed, queries):
+    seed(30)
+    result = client.get("/api/stats/locations?level=plz&land=Deutschland&digits=4").get_json()
+
+    assert result["total"] == 30
+    assert {group["name"]: group["count"] for group in result["groups"]} == {"1011": 5, "1012": 10, "1013": 10, "1014": 5}
+    grouped = [statement for statement in queries if "GROUP BY" in statement]
+    assert grouped and all("substring(adresse.plz, 1, 4)" in statement for statement in grouped)
+
+
+def test_mssql_renders_the_same_expression_everywhere():
+    group = plz_prefix(3)
+    statement = select(group, func.count()).group_by(group).order_by(group)
+    sql = str(statement.compile(dialect=mssql.dialect()))
+    assert sql.count("substring(adresse.plz, 1, 3)") == 3
@@ -0,0 +1,12 @@
+def test_totals_are_counters_and_the_rest_gauges(client):
+    client.get("/api/user/1")
+    types = {}
+    for line in client.get("/api/metrics").get_data(as_text=True).splitlines():
+        if line.startswith("# TYPE "):
+            name, kind = line[len("# TYPE "):].split()
+            types[name] = kind
+
+    assert types["sprachbot_user_cache_misses_total"] == "counter"
+    assert types["sprachbot_db_pool_timeouts_total"] == "counter"
+    assert types["sprachbot_report_queue_depth"] == "gauge"
+    assert all(kind == "counter" for name, kind in types.items() if name.endswith("_total"))
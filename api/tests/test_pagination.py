@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", [
+    "/api/users?limit=abc",
+    "/api/users?limit=10&after=abc",
+    "/api/search?nachname=Muster&limit=abc"
+])
+def test_malformed_numbers_are_rejected(client, seed, path):
+    seed(3)
+    response = client.get(path)
+    assert response.status_code == 400
+    assert "must be an integer" in response.get_json()["error"]
+
+
+def test_page_and_cursor(client, seed):
+    seed(3)
+    page = client.get("/api/users?limit=2").get_json()
+    assert [user["id"] for user in page["users"]] == [1, 2]
+    assert client.get(f"/api/users?limit=2&after={page['next_after']}").get_json()["users"][0]["id"] == 3
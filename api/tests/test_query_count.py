@@ -0,0 +1,34 @@
+import pytest
+
+# Routes returning many users, each must not query per user
+MULTI_ROW_ROUTES = [
+    "/api/users",
+    "/api/users?limit=1000",
+    "/api/users?format=ndjson",
+    "/api/users?fields=vorname,adresse.ort",
+    "/api/search?ort=Berlin",
+    "/api/search?vorname=Ma",
+    "/api/export",
+    "/api/export?format=ndjson"
+]
+
+
+def count_queries(client, queries, route):
+    queries.clear()
+    response = client.get(route)
+    assert response.status_code == 200
+    response.get_data()
+    return len(queries)
+
+
+@pytest.mark.parametrize("route", MULTI_ROW_ROUTES)
+def test_query_count_does_not_grow_with_users(client, queries, seed, route):
+    seed(5)
+    # The first search builds the index
+    client.get(route).get_data()
+    few = count_queries(client, queries, route)
+
+    seed(95, start=5)
+    many = count_queries(client, queries, route)
+
+    assert few == many
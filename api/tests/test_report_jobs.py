@@ -0,0 +1,18 @@
+import report_jobs
+
+
+def test_failed_submit_is_counted_and_returned(client, monkeypatch):
+    def fail():
+        raise RuntimeError("database unavailable")
+
+    jobs = report_jobs.ReportJobs()
+    monkeypatch.setattr(report_jobs, "calculate_statistics", fail)
+    monkeypatch.setattr("routes.report_jobs", jobs)
+
+    response = client.post("/api/reports")
+    assert response.status_code == 202
+    assert response.get_json()["status"] == report_jobs.FAILED
+
+    status = client.get(response.headers["Location"]).get_json()
+    assert status["error"] == "database unavailable"
+    assert jobs.snapshot()["failed"] == 1
@@ -0,0 +1,67 @@
+from collections import Counter
+from threading import Event
+from time import sleep
+
+from sqlalchemy import insert
+
+from database import db
+from models import Person, Adresse
+import search_index
+import statistics_store
+
+
+def names(response):
+    return sorted(user["nachname"] for user in response.get_json())
+
+
+def test_search_returns_all_matches_without_limit(client, seed):
+    seed(150)
+    response = client.get("/api/search?ort=Berlin")
+    assert len(response.get_json()) == 50
+
+
+def test_search_sees_writes_of_other_workers(client, seed):
+    seed(3)
+    assert names(client.get("/api/search?nachname=Mustermann1")) == ["Mustermann1"]
+
+    # Another worker writes, only the data version tells this worker
+    person_id = db.session.scalar(insert(Person).values(vorname="Erika", nachname="Mustermann1b").returning(Person.id))
+    db.session.execute(insert(Adresse).values(person_id=person_id, strasse="Ring", plz="50667", ort="Köln", land="Deutschland"))
+    statistics_store.record_write(Counter({(statistics_store.TOTAL, ""): 1}))
+    db.session.commit()
+
+    assert names(client.get("/api/search?nachname=Mustermann1")) == ["Mustermann1", "Mustermann1b"]
+
+    # The rebuild in the background catches up
+    for _ in range(100):
+        if search_index.index.is_current(statistics_store.data_version()):
+            break
+        sleep(0.01)
+    assert search_index.index.search({"nachname": "mustermann1b"}) == [person_id]
+
+
+def test_rebuild_runs_once_and_keeps_writes_during_it():
+    index = search_index.TrigramIndex()
+    index.build([(1, {"nachname": "Mustermann"})], version=1)
+    started, release = Event(), Event()
+    loads = []
+
+    def load(build):
+        loads.append(1)
+        started.set()
+        release.wait(5)
+        build([(1, {"nachname": "Mustermann"})], 2)
+
+    index.refresh(load)
+    started.wait(5)
+    # A second stale request does not start another build
+    index.refresh(load)
+    # Written after the rows were read
+    index.add(2, {"nachname": "Musterfrau"})
+    index.remove(1)
+    release.set()
+    index.ensure_built(load)
+
+    assert loads == [1]
+    assert index.search({"nachname": "muster"}) == [2]
+    assert index.version == 2
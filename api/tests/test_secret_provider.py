@@ -0,0 +1,13 @@
+import pytest
+
+import secret_provider
+
+
+def test_provider_is_kept_on_the_app(app):
+    assert app.extensions["secrets"].get("SECRET-KEY") == "test"
+
+
+def test_key_vault_without_url_fails(monkeypatch):
+    monkeypatch.delenv("AZURE_KEY_VAULT_URL", raising=False)
+    with pytest.raises(secret_provider.SecretNotFoundError, match="SECRET_PROVIDER=env"):
+        secret_provider.create_provider("keyvault")
@@ -0,0 +1,7 @@
+import json
+
+
+def test_user_keys_are_sorted_like_jsonify(client, seed):
+    seed(1)
+    body = client.get("/api/user/1").get_data(as_text=True)
+    assert body == json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,35 @@
+import statistics_store
+
+
+def test_statistics_from_queries_and_store_agree(client, seed, monkeypatch):
+    seed(20)
+    client.patch("/api/user/1", json={"geburtsdatum": "1990-02-01"})
+    client.patch("/api/user/2", json={"geburtsdatum": "1960-12-31"})
+
+    from_store = client.get("/api/statistics").get_json()
+    monkeypatch.setattr(statistics_store, "ENABLED", False)
+    from_queries = client.get("/api/statistics").get_json()
+
+    assert from_store == from_queries
+    assert from_queries["total_persons"] == 20
+    assert from_queries["oldest"]["id"] == 2
+    assert from_queries["youngest"]["id"] == 1
+
+
+def test_counters_of_a_chunk_are_written_set_based(app, queries):
+    from conftest import user
+    from data_access import create_users
+
+    def counter_statements():
+        return [statement for statement in queries if "statistik" in statement or "SAVEPOINT" in statement]
+
+    create_users([user(number) for number in range(500)])
+    first = counter_statements()
+    queries.clear()
+    # The second chunk updates the existing counters and inserts the new names
+    create_users([user(number) for number in range(500, 1000)])
+    second = counter_statements()
+
+    # One lookup per kind of counter, one UPDATE and a savepoint with one INSERT
+    assert len(first) <= 10 and len(second) <= 10
+    assert statistics_store.differences() == {}
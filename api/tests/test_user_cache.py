@@ -0,0 +1,28 @@
+from user_cache import MemoryBackend
+
+
+def test_read_invalidated_in_between_is_not_stored():
+    backend = MemoryBackend()
+    generation = backend.generation(1)
+    backend.delete(1)
+    backend.set(1, "", "old", generation)
+    assert backend.get(1, "") is None
+
+    backend.set(1, "", "new", backend.generation(1))
+    assert backend.get(1, "") == "new"
+
+
+def test_dropped_invalidations_still_block_older_reads():
+    backend = MemoryBackend(max_size=1)
+    generation = backend.generation(1)
+    backend.delete(1)
+    backend.delete(2)
+    backend.set(1, "", "old", generation)
+    assert backend.get(1, "") is None
+
+
+def test_patched_user_is_served_fresh(client, seed):
+    seed(1)
+    assert client.get("/api/user/1").get_json()["vorname"] == "Max0"
+    client.patch("/api/user/1", json={"vorname": "Erika"})
+    assert client.get("/api/user/1").get_json()["vorname"] == "Erika"
@@ -4,9 +4,9 @@
 from sys import stderr
 from traceback import print_exc
 from datetime import datetime
-import asyncio
 
-from flask import Flask, request, Response
+from aiohttp import web
+from aiohttp.web import Request, Response, json_response
 from botbuilder.core import (
     ConversationState,
     BotFrameworkAdapterSettings,
@@ -18,11 +18,11 @@ from botbuilder.core import (
 from botbuilder.schema import Activity, ActivityTypes
 
 from bots import UserPromptBot
+from bots.lang import client as nlu_client, cache as prediction_cache, fast_path
 from config import DefaultConfig
 
 config = DefaultConfig()
 
-app = Flask(__name__)
 adapter_settings = BotFrameworkAdapterSettings(app_id=config.APP_ID, app_password=config.APP_PASSWORD)
 adapter = BotFrameworkAdapter(adapter_settings)
 
@@ -66,37 +66,42 @@ async def on_error(context: TurnContext, error: Exception):
 adapter.on_turn_error = on_error
 
 
-@app.route("/", methods=["GET"])
-def home():
-    return "Hello, World!"
+async def home(req: Request) -> Response:
+    return Response(text="Hello, World!")
 
-@app.route("/api/messages", methods=["POST"])
-def messages():
-    if "application/json" in request.headers["Content-Type"]:
-        body = request.json
+async def nlu_cache(req: Request) -> Response:
+    return json_response(prediction_cache.stats())
+
+async def nlu_fast_path(req: Request) -> Response:
+    return json_response(fast_path.stats())
+
+async def messages(req: Request) -> Response:
+    if "application/json" in req.headers.get("Content-Type", ""):
+        body = await req.json()
     else:
         return Response(status=415)
 
     activity = Activity().deserialize(body)
-    auth_header = request.headers["Authorization"] if "Authorization" in request.headers else ""
+    auth_header = req.headers.get("Authorization", "")
 
     try:
-        # Erstelle einen Event Loop für die asynchrone Ausführung
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Führe die asynchrone Funktion aus
-        response = loop.run_until_complete(
-            adapter.process_activity(activity, auth_header, bot.on_turn)
-        )
-        
+        # All activities run on the one loop of the server, the NLU connections are reused
+        response = await adapter.process_activity(activity, auth_header, bot.on_turn)
         if response:
-            return response
+            return json_response(data=response.body, status=response.status)
         return Response(status=201)
     except Exception as e:
-        return Response(str(e), status=500)
-    finally:
-        loop.close()
+        return Response(text=str(e), status=500)
+
+async def close_nlu_client(app: web.Application):
+    await nlu_client.close()
+
+app = web.Application()
+app.router.add_get("/", home)
+app.router.add_get("/api/nlu-cache", nlu_cache)
+app.router.add_get("/api/nlu-fast-path", nlu_fast_path)
+app.router.add_post("/api/messages", messages)
+app.on_cleanup.append(close_nlu_client)
 
 if __name__ == "__main__":
-    app.run(host=config.HOST, port=int(config.PORT))
+    web.run_app(app, host=config.HOST, port=int(config.PORT))
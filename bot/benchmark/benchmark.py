@@ -0,0 +1,236 @@
+"""
+Turns per second of the bot on the aiohttp server against the former Flask path
+with a new event loop per activity, CLU and the Bot Connector are simulated
+"""
+
+import sys
+import json
+import asyncio
+import logging
+import warnings
+from os import environ, path
+from time import perf_counter
+from threading import Thread
+from http.client import HTTPConnection
+from concurrent.futures import ThreadPoolExecutor
+
+# The bot modules are imported from the bot directory
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+# Third-party modules
+import click
+from aiohttp import web
+
+SERVERS = ("flask", "aiohttp")
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def start_loop():
+    loop = asyncio.new_event_loop()
+    Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+
+def start_site(loop, app):
+    """
+    Serves the aiohttp app on the loop, returns its base URL
+    """
+    async def start():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    return f"http://127.0.0.1:{port}"
+
+
+def fake_services(nlu_delay):
+    """
+    CLU answers with the first word as vorname_entity after nlu_delay seconds,
+    the Bot Connector accepts every reply
+    """
+    async def handle(request):
+        body = await request.json()
+        if "analysisInput" not in body:
+            return web.json_response({"id": "1"})
+
+        await asyncio.sleep(nlu_delay)
+        words = body["analysisInput"]["conversationItem"]["text"].split()
+        entities = [{"category": "vorname_entity", "text": words[0]}] if words else []
+        return web.json_response({"result": {"prediction": {"entities": entities}}})
+
+    app = web.Application()
+    app.router.add_post("/{tail:.*}", handle)
+    return app
+
+
+def flask_app(adapter, bot):
+    """
+    The former hosting, a threaded Flask server with a new event loop per activity
+    """
+    from flask import Flask, request, Response
+    from botbuilder.schema import Activity
+
+    app = Flask("flask_path")
+
+    @app.route("/api/messages", methods=["POST"])
+    def messages():
+        activity = Activity().deserialize(request.json)
+        auth_header = request.headers.get("Authorization", "")
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            response = loop.run_until_complete(adapter.process_activity(activity, auth_header, bot.on_turn))
+            if response:
+                return Response(json.dumps(response.body), status=response.status)
+            return Response(status=201)
+        finally:
+            loop.close()
+
+    return app
+
+
+def start_flask(app):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    # No log line per request, HTTP/1.1 so the clients keep their connection open
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def activity(service_url, conversation, turn):
+    return {
+        "type": "message",
+        "id": f"{conversation}-{turn}",
+        "channelId": "benchmark",
+        "serviceUrl": service_url,
+        "from": {"id": f"user-{conversation}"},
+        "recipient": {"id": "bot"},
+        "conversation": {"id": f"conversation-{conversation}"},
+        "text": f"Max{turn}"
+    }
+
+
+def run_conversation(base_url, service_url, conversation, deadline):
+    """
+    One user answering until the deadline, every turn asks CLU once and sends one reply
+    """
+    host, port = base_url.rsplit("/", 1)[-1].split(":")
+    connection = HTTPConnection(host, int(port), timeout=60)
+    headers = {"Content-Type": "application/json"}
+    latencies = []
+    errors = 0
+    turn = 0
+    while perf_counter() < deadline:
+        turn += 1
+        body = json.dumps(activity(service_url, conversation, turn))
+        start = perf_counter()
+        try:
+            connection.request("POST", "/api/messages", body, headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+        except OSError:
+            errors += 1
+            connection.close()
+            connection = HTTPConnection(host, int(port), timeout=60)
+            continue
+        latencies.append(perf_counter() - start)
+    connection.close()
+    return latencies, errors
+
+
+def run_server(base_url, service_url, conversations, duration, warmup, offset):
+    if warmup:
+        run_conversation(base_url, service_url, offset, perf_counter() + warmup)
+
+    start = perf_counter()
+    deadline = start + duration
+    with ThreadPoolExecutor(max_workers=conversations) as executor:
+        results = list(executor.map(
+            lambda conversation: run_conversation(base_url, service_url, offset + conversation + 1, deadline),
+            range(conversations)
+        ))
+    elapsed = perf_counter() - start
+
+    latencies = sorted(latency for conversation_latencies, _ in results for latency in conversation_latencies)
+    return {
+        "turns": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "turns_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": _ms(percentile(latencies, 0.50)),
+        "p95_ms": _ms(percentile(latencies, 0.95)),
+        "p99_ms": _ms(percentile(latencies, 0.99))
+    }
+
+
+@click.command()
+@click.option("--servers", default=",".join(SERVERS), show_default=True, help="Comma separated servers.")
+@click.option("--conversations", type=int, default=16, show_default=True, help="Concurrent conversations.")
+@click.option("--duration", type=float, default=10, show_default=True, help="Seconds per server.")
+@click.option("--warmup", type=float, default=2, show_default=True, help="Seconds of warm-up per server.")
+@click.option("--nlu-delay", type=float, default=0.05, show_default=True, help="Seconds CLU needs per request.")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results as JSON.")
+def benchmark(servers, conversations, duration, warmup, nlu_delay, output):
+    """
+    Drive the bot with concurrent conversations on both hostings and report turns per second
+    """
+    servers = [server.strip() for server in servers.split(",") if server.strip()]
+    unknown = [server for server in servers if server not in SERVERS]
+    if unknown:
+        raise click.BadParameter(f"Unknown servers {', '.join(unknown)}", param_hint="--servers")
+
+    services_loop = start_loop()
+    services_url = start_site(services_loop, fake_services(nlu_delay))
+
+    # Without an app id the adapter accepts activities without a token
+    environ["MicrosoftAppId"] = ""
+    environ["MicrosoftAppPassword"] = ""
+    environ["AZURE_CONVERSATIONS_ENDPOINT"] = f"{services_url}/language"
+    environ.setdefault("AZURE_CONVERSATIONS_KEY", "benchmark")
+    from app import app, adapter, bot
+    from bots.lang import cache
+
+    # Every turn asks CLU, the benchmark measures the hosting and not the cache
+    cache.max_size = 0
+    # Sockets of the loops the Flask path closes are left to the garbage collector
+    warnings.simplefilter("ignore", ResourceWarning)
+    logging.getLogger("asyncio").setLevel(logging.CRITICAL)
+
+    results = {}
+    click.echo(f"{'server':<10} {'turns':>8} {'errors':>7} {'turns/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for number, server in enumerate(servers):
+        if server == "flask":
+            base_url = start_flask(flask_app(adapter, bot))
+        else:
+            base_url = start_site(start_loop(), app)
+        result = results[server] = run_server(
+            base_url, services_url, conversations, duration, warmup, offset=number * 100000
+        )
+        click.echo(f"{server:<10} {result['turns']:>8} {result['errors']:>7} {result['turns_per_second']:>9} "
+                   f"{result['p50_ms']!s:>9} {result['p95_ms']!s:>9} {result['p99_ms']!s:>9}")
+
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump({"conversations": conversations, "nlu_delay": nlu_delay, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    benchmark()
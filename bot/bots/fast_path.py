@@ -0,0 +1,118 @@
+import re
+from datetime import date
+from threading import Lock
+
+from recognizers_number import recognize_number, Culture
+
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+TELEPHONE = re.compile(r"(?<![\w+])\+?\d[\d ]{5,}\d(?!\w)")
+POSTAL_CODE = re.compile(r"(?<!\w)\d{5}(?!\w)")
+HOUSE_NUMBER = re.compile(r"(?<!\w)\d{1,4}(?: ?[a-zA-Z](?![a-zA-Z]))?(?!\w)")
+DATE = re.compile(r"(?<![\w.])(\d{1,2})\. ?(\d{1,2})\. ?(\d{4})(?![\w.])")
+DIGIT = re.compile(r"\d")
+
+
+def _single(pattern, text, numbers=False):
+    """
+    The only match of the pattern, None if there is none or more than one or
+    if digits outside of the match could mean something else
+    """
+    matches = list(pattern.finditer(text))
+    if len(matches) != 1:
+        return None
+    match = matches[0]
+    if DIGIT.search(text[:match.start()] + text[match.end():]):
+        return None
+    # Numbers as words are left to CLU, recognizers_number has no German culture
+    if numbers and len(recognize_number(text, Culture.English)) > 1:
+        return None
+    return match
+
+
+def _email(text):
+    matches = list(EMAIL.finditer(text))
+    if len(matches) == 1:
+        return matches[0].group(), matches[0]
+    return None, None
+
+
+def _telephone(text):
+    match = _single(TELEPHONE, text)
+    if match and 7 <= len(DIGIT.findall(match.group())) <= 15:
+        return match.group().strip(), match
+    return None, None
+
+
+def _postal_code(text):
+    match = _single(POSTAL_CODE, text, numbers=True)
+    return (match.group(), match) if match else (None, None)
+
+
+def _house_number(text):
+    match = _single(HOUSE_NUMBER, text, numbers=True)
+    return (match.group(), match) if match else (None, None)
+
+
+def _date(text):
+    match = _single(DATE, text)
+    if not match:
+        return None, None
+    day, month, year = (int(part) for part in match.groups())
+    try:
+        date(year, month, day)
+    except ValueError:
+        return None, None
+    return f"{day:02d}.{month:02d}.{year}", match
+
+
+# Entity types of CLU that have a local extractor
+EXTRACTORS = {
+    "e-mail_entity": _email,
+    "telefonnummer_entity": _telephone,
+    "plz_entity": _postal_code,
+    "hausnummer_entity": _house_number,
+    "geburtstag_entity": _date
+}
+
+
+class FastPath:
+    """
+    Extracts structured answers locally, the remote call is only needed
+    if the answer is not unambiguous
+    """
+
+    def __init__(self):
+        self.hits = {}
+        self.misses = {}
+        self._lock = Lock()
+
+    def extract(self, text, entity_type, whole=False):
+        """
+        The value of the entity or None, with whole the answer must
+        consist of nothing else so no other entity is missed
+        """
+        extractor = EXTRACTORS.get(entity_type)
+        if extractor is None:
+            return None
+
+        text = text.strip()
+        value, match = extractor(text)
+        if whole and match is not None and (match.start(), match.end()) != (0, len(text)):
+            value = None
+        with self._lock:
+            counter = self.hits if value is not None else self.misses
+            counter[entity_type] = counter.get(entity_type, 0) + 1
+        return value
+
+    def stats(self):
+        stats = {}
+        with self._lock:
+            for entity_type in EXTRACTORS:
+                hits = self.hits.get(entity_type, 0)
+                misses = self.misses.get(entity_type, 0)
+                stats[entity_type] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None
+                }
+        return stats
@@ -1,47 +1,155 @@
 from os import getenv
+from sys import stderr
+from random import uniform
+import asyncio
 
-from requests import post
-
-
-def analyze_query(query: str, entity_type: str):
-    
-    endpoint = getenv("AZURE_CONVERSATIONS_ENDPOINT")
-    key = getenv("AZURE_CONVERSATIONS_KEY")
-    
-    url = f"{endpoint}:analyze-conversations?api-version=2024-11-15-preview"
-    
-    headers = {
-        "Ocp-Apim-Subscription-Key": key,
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "kind": "Conversation",
-        "analysisInput": {
-            "conversationItem": {
-                "id": "1",
-                "text": query,
-                "modality": "text",
-                "language": "de",
-                "participantId": "1"
+from aiohttp import ClientSession, ClientTimeout, ClientError, TCPConnector
+
+from .prediction_cache import PredictionCache
+from .fast_path import FastPath
+
+# CLU project and deployment that are asked
+PROJECT_NAME = "chatbot"
+DEPLOYMENT_NAME = getenv("CLU_DEPLOYMENT_NAME", "chatbot-deployment-0.0.6")
+API_VERSION = "2024-11-15-preview"
+
+# Seconds for the whole request and for opening a connection
+NLU_TIMEOUT = float(getenv("NLU_TIMEOUT", "5"))
+NLU_CONNECT_TIMEOUT = float(getenv("NLU_CONNECT_TIMEOUT", "2"))
+# Retries after the first attempt and seconds of the first backoff, doubled per retry
+NLU_RETRIES = int(getenv("NLU_RETRIES", "2"))
+NLU_BACKOFF = float(getenv("NLU_BACKOFF", "0.2"))
+# Open connections kept to the CLU endpoint
+NLU_POOL_SIZE = int(getenv("NLU_POOL_SIZE", "20"))
+
+# Answers that are retried, everything else is returned as is
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class NluClient:
+    """
+    Async client for Conversational Language Understanding with one
+    keep-alive session per event loop, timeouts and retries with backoff
+    """
+
+    def __init__(self, endpoint=None, key=None, deployment_name=DEPLOYMENT_NAME,
+                 timeout=NLU_TIMEOUT, connect_timeout=NLU_CONNECT_TIMEOUT,
+                 retries=NLU_RETRIES, backoff=NLU_BACKOFF, pool_size=NLU_POOL_SIZE):
+        self.endpoint = endpoint or getenv("AZURE_CONVERSATIONS_ENDPOINT")
+        self.key = key or getenv("AZURE_CONVERSATIONS_KEY")
+        self.deployment_name = deployment_name
+        self.timeout = ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._sessions = {}
+
+    async def _get_session(self):
+        # A session belongs to the loop it was created in, the ones
+        # of loops that were closed meanwhile are closed here
+        loop = asyncio.get_running_loop()
+        for stale in [other for other in list(self._sessions) if other.is_closed()]:
+            session = self._sessions.pop(stale, None)
+            if session is not None:
+                # A closed loop has no connections left to wait for
+                await session.close()
+
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = self._sessions[loop] = ClientSession(
+                connector=TCPConnector(limit_per_host=self.pool_size, keepalive_timeout=60),
+                timeout=self.timeout,
+                headers={"Ocp-Apim-Subscription-Key": self.key or ""}
+            )
+        return session
+
+    async def close(self):
+        # Sessions of loops running in other threads are closed there
+        loop = asyncio.get_running_loop()
+        sessions, self._sessions = self._sessions, {}
+        for owner, session in sessions.items():
+            if owner is loop or owner.is_closed():
+                await session.close()
+            elif owner.is_running():
+                asyncio.run_coroutine_threadsafe(session.close(), owner)
+
+    def _request(self, query):
+        return {
+            "kind": "Conversation",
+            "analysisInput": {
+                "conversationItem": {
+                    "id": "1",
+                    "text": query,
+                    "modality": "text",
+                    "language": "de",
+                    "participantId": "1"
+                }
+            },
+            "parameters": {
+                "projectName": PROJECT_NAME,
+                "verbose": True,
+                "deploymentName": self.deployment_name,
+                "stringIndexType": "TextElement_V8"
             }
-        },
-        "parameters": {
-            "projectName": "chatbot",
-            "verbose": True,
-            "deploymentName": "chatbot-deployment-0.0.6",
-            "stringIndexType": "TextElement_V8"
         }
-    }
-    
-    response = post(url, headers=headers, json=data)
-    entities = response.json().get('result', {}).get('prediction', {}).get('entities', [])
 
-    for entity in entities:
-        if entity.get('category') == entity_type:
-            result = entity.get('text')
-            print(result)
-            return result
+    async def analyze(self, query: str):
+        """
+        Returns all entities CLU predicts for the query, None
+        if the endpoint does not answer after the retries
+        """
+        url = f"{self.endpoint}:analyze-conversations?api-version={API_VERSION}"
+        for attempt in range(self.retries + 1):
+            try:
+                session = await self._get_session()
+                async with session.post(url, json=self._request(query)) as response:
+                    if response.status in RETRY_STATUS:
+                        error = f"status {response.status}"
+                    elif response.status >= 400:
+                        # A wrong key or request does not get better with retries
+                        print(f"CLU request failed with status {response.status}", file=stderr)
+                        return None
+                    else:
+                        data = await response.json()
+                        return data.get("result", {}).get("prediction", {}).get("entities", [])
+            except (ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+
+            if attempt < self.retries:
+                # Exponential backoff with jitter, parallel conversations do not retry in lockstep
+                await asyncio.sleep(self.backoff * 2 ** attempt * uniform(0.5, 1.5))
+
+        print(f"CLU request failed after {self.retries + 1} attempts: {error}", file=stderr)
+        return None
+
+
+client = NluClient()
+cache = PredictionCache()
+fast_path = FastPath()
 
-    return None
 
+async def analyze_entities(query: str, entity_type: str):
+    """
+    Text of the first entity per category in one request, entity_type is
+    the entity of the question that was asked
+    """
+    # An answer that is only the asked value has no other entities
+    result = fast_path.extract(query, entity_type, whole=True)
+    if result is not None:
+        return {entity_type: result}
+
+    # Cached with all categories, entity type None
+    found, result = cache.get(query, None)
+    if found:
+        return dict(result)
+
+    entities = await client.analyze(query)
+    if entities is None:
+        return {}
+
+    result = {}
+    for entity in entities:
+        result.setdefault(entity.get('category'), entity.get('text'))
+
+    cache.set(query, None, result)
+    return dict(result)
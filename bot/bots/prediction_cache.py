@@ -0,0 +1,62 @@
+from os import getenv
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from unicodedata import normalize
+
+# Number of predictions kept and seconds they are reused
+NLU_CACHE_SIZE = int(getenv("NLU_CACHE_SIZE", "1000"))
+NLU_CACHE_TTL = float(getenv("NLU_CACHE_TTL", "3600"))
+
+
+def normalize_text(text: str) -> str:
+    # The case is kept, the cached entity text is stored as the user typed it
+    return " ".join(normalize("NFC", text).split())
+
+
+class PredictionCache:
+    """
+    LRU with a time to live for the entities CLU predicts, keyed by text
+    and entity type. The deployment is fixed per process, a new one starts
+    with an empty cache.
+    """
+
+    def __init__(self, max_size=NLU_CACHE_SIZE, ttl=NLU_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, text, entity_type):
+        """
+        Returns (True, value) for a cached prediction, (False, None) otherwise
+        """
+        key = (normalize_text(text), entity_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, text, entity_type, value):
+        key = (normalize_text(text), entity_type)
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else None
+        }
@@ -2,6 +2,8 @@
 # Licensed under the MIT License.
 
 from datetime import datetime
+from collections import namedtuple
+import asyncio
 
 from recognizers_number import recognize_number, Culture
 
@@ -16,7 +18,34 @@ from botbuilder.core import (
 # Own modules
 from data_models import ConversationFlow, Question, UserProfile
 from .create_user import create_user
-from .lang import analyze_query
+from .lang import analyze_entities
+
+# Entity, hint appended to the query, profile attribute, validator, confirmation and question
+Slot = namedtuple("Slot", "entity suffix attribute validator confirmation prompt")
+
+SLOTS = {
+    Question.FIRST_NAME: Slot("vorname_entity", "", "first_name", "_validate_name",
+                              "Hallo {}", "Wie lautet Ihr Vorname?"),
+    Question.LAST_NAME: Slot("nachname_entity", " (Nachname)", "last_name", "_validate_name",
+                             "Dein Nachname ist {}.", "Wie lautet Ihr Nachname?"),
+    Question.DATE_OF_BIRTH: Slot("geburtstag_entity", "", "date_of_birth", "_validate_date",
+                                 "Dein Geburstag ist der {}.", "Wann wurden Sie geboren?"),
+    Question.EMAIL: Slot("e-mail_entity", "", "email", "_validate_email",
+                         "Deine E-Mail-Adresse ist {}.", "Wie lautet Ihre E-Mail-Adresse?"),
+    Question.TELEPHONE_NUMBER: Slot("telefonnummer_entity", "", "telephone_number", "_validate_tel",
+                                    "Diene Telefonnummer ist {}.", "Wie lautet Ihre Telefonnummer?"),
+    Question.STREET: Slot("straße_entity", " (Straße)", "street", "_validate_street",
+                          "Sie leben in der Straße {}.", "In welcher Straße wohnen Sie?"),
+    Question.HOUSE_NUMBER: Slot("hausnummer_entity", "", "house_number", "_validate_house_number",
+                                "ihre Haus Nummer lautet {}.", "Wie lautet die Nummer Ihres Hauses?"),
+    Question.POSTAL_CODE: Slot("plz_entity", "", "postal_code", "_validate_postal_code",
+                               "Ihre Postleitzahl ist die {}.", "In welcher Postleitzahl wohnen Sie?"),
+    Question.CITY: Slot("ort_entity", "", "city", "_validate_city",
+                        "Ihre Stadt heißt {}.", "In welcher Stadt leben Sie?"),
+    Question.COUNTRY: Slot("land_entity", "", "country", "_validate_country",
+                           "Sie leben im Land {}.", "In welchem Land leben Sie?")
+}
+
 
 class ValidationResult:
     def __init__(
@@ -65,209 +94,78 @@ class UserPromptBot(ActivityHandler):
             await turn_context.send_activity(
                 MessageFactory.text("Dann fangen wir mal an. Wie lautet Ihr Vorname?")
             )
+            flow.answered = []
             flow.last_question_asked = Question.FIRST_NAME
+            return
+
+        # validate the answer, one request returns all entities of the utterance
+        question = flow.last_question_asked
+        slot = SLOTS[question]
+        entities = await analyze_entities(f"{user_input}{slot.suffix}", slot.entity)
+        ml_result = entities.get(slot.entity)
+        validate_result = getattr(self, slot.validator)(ml_result)
+        if not validate_result.is_valid:
+            await turn_context.send_activity(
+                MessageFactory.text(validate_result.message)
+            )
+            return
+        await self._store_answer(question, validate_result.value, flow, profile, turn_context)
+
+        # fill the other slots of the utterance, invalid ones are asked later
+        for other, other_slot in SLOTS.items():
+            text = entities.get(other_slot.entity)
+            # the same words are not two answers
+            if other in flow.answered or not text or text == ml_result:
+                continue
+            other_result = getattr(self, other_slot.validator)(text)
+            if other_result.is_valid:
+                await self._store_answer(other, other_result.value, flow, profile, turn_context)
+
+        # ask for the next unanswered question
+        next_question = flow.next_question()
+        if next_question != Question.NONE:
+            await turn_context.send_activity(
+                MessageFactory.text(SLOTS[next_question].prompt)
+            )
+            flow.last_question_asked = next_question
+            return
+
+        # The request to the API blocks, it must not stop the other conversations
+        await asyncio.to_thread(create_user,
+                profile.first_name,
+                profile.last_name,
+                profile.date_of_birth,
+                profile.email,
+                profile.telephone_number,
+                profile.street,
+                profile.house_number,
+                profile.postal_code,
+                profile.city,
+                profile.country)
+
+        await turn_context.send_activity(
+            MessageFactory.text(f"Der Nutzer wurde erfolgreich erstellt. Das war's!")
+        )
+        flow.last_question_asked = Question.NONE
 
-        # validate first name then ask for lastname
-        elif flow.last_question_asked == Question.FIRST_NAME:
-            ml_result = analyze_query(user_input, "vorname_entity")
-            validate_result = self._validate_name(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.first_name = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Hallo {profile.first_name}")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text("Wie lautet Ihr Nachname?")
-                )
-                flow.last_question_asked = Question.LAST_NAME
-
-        # validate last name then ask for birth date
-        elif flow.last_question_asked == Question.LAST_NAME:
-            ml_result = analyze_query(f"{user_input} (Nachname)", "nachname_entity")
-            validate_result = self._validate_name(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.last_name = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Dein Nachname ist {profile.last_name}.")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text("Wann wurden Sie geboren?")
-                )
-                flow.last_question_asked = Question.DATE_OF_BIRTH
-
-        # validate birth date then ask for email
-        elif flow.last_question_asked == Question.DATE_OF_BIRTH:
-            ml_result = analyze_query(user_input, "geburtstag_entity")
-            validate_result = self._validate_date(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.date_of_birth = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(
-                        f"Dein Geburstag ist der {profile.date_of_birth}."
-                    )
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text(
-                        f"Wie lautet Ihre E-Mail-Adresse?"
-                    )
-                )
-                flow.last_question_asked = Question.EMAIL
-
-                # Konvertiere das Datum in YYYY-MM-DD Format
-                try:
-                    date_obj = datetime.strptime(profile.date_of_birth, '%d.%m.%Y')
-                    profile.date_of_birth = date_obj.strftime('%Y-%m-%d')
-                except ValueError:
-                    print("Fehler bei der Datumsumwandlung")
-        
-        # validate email date then ask for TELEPHONE_NUMBER
-        elif flow.last_question_asked == Question.EMAIL:
-            ml_result = analyze_query(user_input, "e-mail_entity")
-            validate_result = self._validate_email(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.email = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Deine E-Mail-Adresse ist {profile.email}.")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Wie lautet Ihre Telefonnummer?")
-                )
-                flow.last_question_asked = Question.TELEPHONE_NUMBER
-
-        # validate tele then ask for street
-        elif flow.last_question_asked == Question.TELEPHONE_NUMBER:
-            ml_result = analyze_query(user_input, "telefonnummer_entity")
-            validate_result = self._validate_tel(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.telephone_number = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Diene Telefonnummer ist {profile.telephone_number}.")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text(f"In welcher Straße wohnen Sie?")
-                )
-                flow.last_question_asked = Question.STREET
-
-        # validate stree then ask for house number
-        elif flow.last_question_asked == Question.STREET:
-            ml_result = analyze_query(f"{user_input} (Straße)", "straße_entity")
-            validate_result = self._validate_street(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.street = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Sie leben in der Straße {profile.street}.")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Wie lautet die Nummer Ihres Hauses?")
-                )
-                flow.last_question_asked = Question.HOUSE_NUMBER
-        
-        # validate housenumber then ask for postal code
-        elif flow.last_question_asked == Question.HOUSE_NUMBER:
-            ml_result = analyze_query(user_input, "hausnummer_entity")
-            validate_result = self._validate_house_number(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.house_number = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"ihre Haus Nummer lautet {profile.house_number}.")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text(f"In welcher Postleitzahl wohnen Sie?")
-                )
-                flow.last_question_asked = Question.POSTAL_CODE
-
-        # validate postal_code then ask for city
-        elif flow.last_question_asked == Question.POSTAL_CODE:
-            ml_result = analyze_query(user_input, "plz_entity")
-            validate_result = self._validate_postal_code(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.postal_code = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Ihre Postleitzahl ist die {profile.postal_code}.")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text(f"In welcher Stadt leben Sie?")
-                )
-                flow.last_question_asked = Question.CITY
-
-        # validate city then ask for country
-        elif flow.last_question_asked == Question.CITY:
-            ml_result = analyze_query(user_input, "ort_entity")
-            validate_result = self._validate_city(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.city = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Ihre Stadt heißt {profile.city}.")
-                )
-                await turn_context.send_activity(
-                    MessageFactory.text(f"In welchem Land leben Sie?")
-                )
-                flow.last_question_asked = Question.COUNTRY
-        
-        # validate country then ask for noting
-        elif flow.last_question_asked == Question.COUNTRY:
-            ml_result = analyze_query(user_input, "land_entity")
-            validate_result = self._validate_country(ml_result)
-            if not validate_result.is_valid:
-                await turn_context.send_activity(
-                    MessageFactory.text(validate_result.message)
-                )
-            else:
-                profile.country = validate_result.value
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Sie leben im Land {profile.country}.")
-                )
-                create_user(profile.first_name,
-                        profile.last_name,
-                        profile.date_of_birth,
-                        profile.email,
-                        profile.telephone_number,
-                        profile.street,
-                        profile.house_number,
-                        profile.postal_code,
-                        profile.city,
-                        profile.country)
-                
-                await turn_context.send_activity(
-                    MessageFactory.text(f"Der Nutzer wurde erfolgreich erstellt. Das war's!")
-                )
-                flow.last_question_asked = Question.NONE
+    async def _store_answer(
+        self, question: Question, value, flow: ConversationFlow, profile: UserProfile,
+        turn_context: TurnContext
+    ):
+        slot = SLOTS[question]
+        setattr(profile, slot.attribute, value)
+        flow.answered.append(question)
+        await turn_context.send_activity(
+            MessageFactory.text(slot.confirmation.format(value))
+        )
+
+        # Konvertiere das Datum in YYYY-MM-DD Format
+        if question == Question.DATE_OF_BIRTH:
+            try:
+                date_obj = datetime.strptime(profile.date_of_birth, '%d.%m.%Y')
+                profile.date_of_birth = date_obj.strftime('%Y-%m-%d')
+            except ValueError:
+                print("Fehler bei der Datumsumwandlung")
 
     def _validate_name(self, user_input: str) -> ValidationResult:
         if not user_input:
@@ -306,6 +204,12 @@ class UserPromptBot(ActivityHandler):
         return ValidationResult(is_valid=True, value=user_input)
 
     def _validate_date(self, user_input: str) -> ValidationResult:
+        if not user_input:
+            return ValidationResult(
+                is_valid=False,
+                message="Bitte geben Sie das Datum im Format TT.MM.JJJJ ein (z.B. 19.02.2001)"
+            )
+
         try:
             # Versuche das Datum im Format DD.MM.YYYY zu parsen
             date_parts = user_input.split('.')
@@ -16,6 +16,15 @@ class Question(Enum):
 
 class ConversationFlow:
     def __init__(
-        self, last_question_asked: Question = Question.NONE,
+        self, last_question_asked: Question = Question.NONE, answered: list = None,
     ):
         self.last_question_asked = last_question_asked
+        # Also the questions answered along with another one
+        self.answered = answered or []
+
+    def next_question(self) -> Question:
+        for question in Question:
+            if question != Question.NONE and question not in self.answered:
+                return question
+        return Question.NONE
+
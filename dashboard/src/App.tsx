@@ -11,6 +11,7 @@ function App() {
   const [users, setUsers] = useState<User[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
   const [error, setError] = useState<string | null>(null);
+  const [lastUpdate, setLastUpdate] = useState<number>(Date.now());
 
   const fetchUsers = useCallback(async () => {
     setLoading(true);
@@ -22,6 +23,7 @@ function App() {
       }
       const data = await response.json();
       setUsers(data);
+      setLastUpdate(Date.now());
     } catch (e: any) {
       setError(e.message);
     } finally {
@@ -60,7 +62,7 @@ function App() {
             </div>
             
             <div className="bg-white rounded-lg shadow-sm">
-              <UserCountChart users={users} />
+              <UserCountChart lastUpdate={lastUpdate} />
             </div>
             
             <div className="bg-white rounded-lg shadow-sm">
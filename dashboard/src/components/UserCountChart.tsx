@@ -1,27 +1,34 @@
-import React, { useRef, useEffect } from 'react';
+import React, { useRef, useEffect, useState } from 'react';
 import * as d3 from 'd3';
-import { User } from '../types/user';
+import { LocationStatistics } from '../types/user';
+
+const apiUrl = import.meta.env.VITE_API_URL;
+
+// Number of cities shown, the API sums up the remaining ones
+const TOP_CITIES = 20;
 
 interface UserCountChartProps {
-  users: User[];
+  lastUpdate: number;
 }
 
-const UserCountChart: React.FC<UserCountChartProps> = ({ users }) => {
+const UserCountChart: React.FC<UserCountChartProps> = ({ lastUpdate }) => {
   const chartRef = useRef<HTMLDivElement>(null);
+  const [stats, setStats] = useState<LocationStatistics | null>(null);
+
+  useEffect(() => {
+    // Counts are grouped by the API, only the top cities are transferred
+    fetch(`${apiUrl}/api/stats/locations?level=ort&top=${TOP_CITIES}`)
+      .then((response) => (response.ok ? response.json() : null))
+      .then((data: LocationStatistics | null) => setStats(data))
+      .catch(() => setStats(null));
+  }, [lastUpdate]);
 
   useEffect(() => {
-    if (users && users.length > 0 && chartRef.current) {
+    if (stats && stats.groups.length > 0 && chartRef.current) {
       // Clear previous chart
       d3.select(chartRef.current).select('svg').remove();
 
-      // Aggregate data
-      const cityCounts = d3.rollup(
-        users,
-        (v) => v.length,
-        (d) => d.adresse.ort
-      );
-      const sortedCityCounts = Array.from(cityCounts).sort(([, a], [, b]) => b - a);
-      const data = sortedCityCounts.map(([city, count]) => ({ city, count }));
+      const data = stats.groups.map(({ name, count }) => ({ city: name, count }));
 
       const margin = { top: 20, right: 30, bottom: 70, left: 60 };
       const width = 600 - margin.left - margin.right;
@@ -72,7 +79,7 @@ const UserCountChart: React.FC<UserCountChartProps> = ({ users }) => {
         .attr('height', d => height - y(d.count))
         .attr('fill', '#3B82F6'); // Tailwind blue-500
     }
-  }, [users]);
+  }, [stats]);
 
   return (
     <div className="overflow-hidden">
@@ -30,6 +30,22 @@ export interface CreateUserI {
   land: string;
 }
 
+export interface LocationGroup {
+  name: string;
+  count: number;
+  drilldown: Record<string, string | number> | null;
+}
+
+export interface LocationStatistics {
+  level: 'land' | 'plz' | 'ort';
+  land: string | null;
+  plz: string | null;
+  digits: number | null;
+  total: number;
+  groups: LocationGroup[];
+  other: number;
+}
+
 export interface ApiError {
   error: string;
 }
\ No newline at end of file